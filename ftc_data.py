@@ -1,40 +1,119 @@
-﻿import pandas as pd
+﻿import importlib.util
+import sys
 
-from src.ftc_api.ftc_requests import FtcRequests
-from src.stats import stats
-from src.stats.report import Prelook
-from src.stats.report import Live_Report
+def lazy(name):
+	"""
+	Returns a module that is only imported on first attribute access.
+
+	Keeps this module quick to import for scripts that only call a few of its functions, since
+	pandas and requests are only loaded by the functions that need them.
+	"""
+	if name in sys.modules:
+		return sys.modules[name]
+	spec = importlib.util.find_spec(name)
+	spec.loader = importlib.util.LazyLoader(spec.loader)
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[name] = module
+	spec.loader.exec_module(module)
+	parent, _, child = name.rpartition('.')
+	setattr(sys.modules[parent], child, module)
+	return module
+
+ftc_requests = lazy('src.ftc_api.ftc_requests')
+alliance = lazy('src.stats.alliance')
+batch = lazy('src.stats.batch')
+live = lazy('src.stats.live')
+predict = lazy('src.stats.predict')
+report = lazy('src.stats.report')
+seasons = lazy('src.stats.seasons')
+stats = lazy('src.stats.stats')
+instrument = lazy('src.instrument.instrument')
+storage = lazy('src.storage.storage')
 
 team_filter = ['matchNumber', 'win', 'location', 'ascent', 'Auto', 'EndGame', 'Fouls', 'x̄ Bucket', 'x̄ Specimen', 'x̄ Pts', 'σ Bucket', 'σ Specimen', 'σ Pts', 'Max Bucket', 'Max Specimen', 'Max Pts']
 
 # User terminal function to access code
 
 ### Access Database
+# Tables are cached between calls and read-only, copy() them to make changes
 def view_events():
-	return pd.read_pickle('data/2024/events.pkl')
+	return storage.load('events', seasons.current.year)
 
 def view_matches():
-	return pd.read_pickle('data/2024/matches.pkl')
+	return storage.load('matches', seasons.current.year)
 
 def view_stats():
-	return pd.read_pickle('data/2024/stats.pkl')
+	return storage.load('stats', seasons.current.year)
 
 def view_aggregated_stats():
-	return pd.read_pickle('data/2024/agg_stats.pkl')
+	return storage.load('agg_stats', seasons.current.year)
+
+def view_memory_usage():
+	return storage.memory_report(seasons.current.year)
+
+## Seasons
+def use_season(year):
+	"""Switches every function here to a registered season e.g. 2024, see seasons.register."""
+	return seasons.use(year)
 
 ## Update Database
-def update_database(event_codes):
-	stats.update_statistics(event_codes, FtcRequests())
+def update_database(event_codes, full=False, log=None, profile=None, workers=None, stream=False):
+	"""
+	Updates the statistics of the listed events.
+
+	Args:
+		event_codes: list of alphanumeric event identifier strings e.g. ['USPAPHQ1']
+		full: rebuild every table from all tracked matches
+		log: JSON lines file to append per stage timings, rows, peak memory and HTTP traffic to
+		profile: True to print a cProfile summary, or a file to dump the profile to
+		workers: number of processes to process events in, one event per task
+		stream: store each event as it arrives to bound memory, e.g. for a whole season backfill, needs Parquet storage
+	"""
+	sinks = [instrument.JsonLinesSink(log)] if log else []
+	with instrument.recording(*sinks, memory=bool(log)):
+		if profile:
+			with instrument.profiled(None if profile is True else profile):
+				stats.update_statistics(event_codes, ftc_requests.FtcRequests(), full, workers=workers, stream=stream)
+		else:
+			stats.update_statistics(event_codes, ftc_requests.FtcRequests(), full, workers=workers, stream=stream)
+
+def update_seasons(season_events, full=False):
+	"""Updates several seasons in parallel, given a dict of season year to list of event codes."""
+	stats.update_seasons(season_events, full=full)
 
 def scout_event(event_code, team_dict):
-	report = Prelook(event_code, team_dict)
-	report.to_csv()
-	return report.display()
+	prelook = report.Prelook(event_code, team_dict)
+	prelook.to_csv()
+	return prelook.display()
+
+def scout_events(event_teams):
+	"""Writes the Prelook of each of many upcoming events, given a dict of event code to team dict."""
+	prelooks = report.prelooks(event_teams)
+	for prelook in prelooks.values():
+		prelook.to_csv()
+	return {code: prelook.display() for code, prelook in prelooks.items()}
+
+def scout_batch(event_codes=None, live=False, workers=8):
+	"""Writes the prelooks, or live reports, of many events at once, by default every upcoming stored event."""
+	reports, _ = batch.batch_reports(event_codes, live, workers=workers)
+	return {code: scouting_report.display() for code, scouting_report in reports.items()}
 
 def scout_event_live(event_code):
-	report = Live_Report(event_code, FtcRequests())
-	report.to_csv()
-	return report.display()
+	live_report = report.Live_Report(event_code, ftc_requests.FtcRequests())
+	live_report.to_csv()
+	return live_report.display()
+
+def predict_event(event_code, samples=100_000):
+	"""Returns win probabilities of an event's remaining qualifiers and its projected rankings, from its stored matches."""
+	return predict.predict_event(event_code, ftc_requests.FtcRequests(), samples)
+
+def pick_list(event_code, n_alliances=4, alliance_size=2, alliances=()):
+	"""Returns the candidates for the next alliance selection pick, best first, given the team numbers of the alliances chosen so far."""
+	return alliance.pick_list(event_code, n_alliances, alliance_size, alliances)
+
+def watch_event(event_code, interval=30):
+	"""Keeps an event's live report CSVs current until stopped, returning the latency of each processed match."""
+	return live.EventWatcher(event_code, ftc_requests.FtcRequests(), interval).run()
 
 def add_override(fit: str ,team_id, match_number, playoff=False, event_code='USPAUCQ1'):
 	"""
@@ -43,7 +122,8 @@ def add_override(fit: str ,team_id, match_number, playoff=False, event_code='USP
 	2bucket
 	2specimen
 	"""
-	df = pd.read_csv('overrides/' + event_code + ".csv")
-	df.set_index(['team_id', 'match_number', 'playoff'], inplace=True)
-	df.loc[team_id, match_number, playoff] = [fit]
-	df.to_csv('overrides/' + event_code + ".csv")
\ No newline at end of file
+	seasons.current.fit_overrides.add(event_code, [(team_id, match_number, playoff, fit)])
+
+def add_overrides(overrides, event_code='USPAUCQ1'):
+	"""Adds a batch of (fit, team_id, match_number, playoff) overrides in one write."""
+	seasons.current.fit_overrides.add(event_code, [(team_id, match_number, playoff, fit) for fit, team_id, match_number, playoff in overrides])
\ No newline at end of file
@@ -0,0 +1,138 @@
+﻿import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.benchmark.synthetic import SyntheticSeason
+from src.stats import stats
+from src.stats.report import Prelook, Live_Report
+from src.storage import schema, storage
+
+# Repository root, where ftc_data is imported from
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Season sizes from a single qualifier up to a worldwide season
+SCALES = {
+	'qualifier': {'n_events': 1, 'teams_per_event': 24},
+	'region': {'n_events': 15, 'teams_per_event': 28},
+	'national': {'n_events': 150, 'teams_per_event': 32},
+	'world': {'n_events': 1200, 'teams_per_event': 32, 'n_teams': 8000}
+	}
+
+def timed(fn, repeat=1):
+	"""Returns the result of a call and the fastest of repeat timings in seconds."""
+	best = float('inf')
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = fn()
+		best = min(best, time.perf_counter() - start)
+	return result, best
+
+def bench_season(season: SyntheticSeason, repeat=1):
+	"""
+	Returns a dict of stage name to seconds for one synthetic season, and its number of match rows.
+
+	Runs the update_statistics stages one by one on freshly stored tables, then update_statistics
+	as a whole, then builds the reports of the season's last event. Tables are stored in the
+	current directory.
+
+	Args:
+		season: the season to process
+		repeat: times to run each stage, keeping the fastest
+	"""
+	codes = list(season.events.code)
+	storage.write('events', season.events)
+	event_data, seconds = timed(lambda: list(season.get_events_data(codes)))
+	times = {'generate': seconds}
+
+	frames, times['process_event'] = timed(lambda: [stats.process_event(e['mf'], e['qf'], e['pf'], code) for code, e in zip(codes, event_data)], repeat)
+	matches = schema.apply('matches', pd.concat(frames, ignore_index=True))
+	storage.write('matches', matches)
+	reg_matches = matches[~matches.playoff]
+
+	oprs, times['calculate_opr'] = timed(lambda: stats.calculate_opr(reg_matches), repeat)
+	opr_stats = pd.concat(oprs).reset_index(drop=True).rename(columns={'index': 'teamNumber'})
+	storage.write('stats', opr_stats)
+	_, times['update_aggregations'] = timed(lambda: stats.update_aggregations(reg_matches), repeat)
+	disagg_matches, times['update_disaggregate_matches'] = timed(lambda: stats.update_disaggregate_matches(matches, opr_stats), repeat)
+	_, times['update_team_stats'] = timed(lambda: stats.update_team_stats(disagg_matches), repeat)
+	_, times['update_statistics'] = timed(lambda: stats.update_statistics(codes, season, full=True, event_data=event_data), repeat)
+
+	code = codes[-1]
+	team_dict = season.get_event_teams(code)
+	_, times['Prelook'] = timed(lambda: Prelook(code, team_dict), repeat)
+	_, times['Live_Report'] = timed(lambda: Live_Report(code, season, team_dict, update=False), repeat)
+	return times, len(matches)
+
+def import_time(module='ftc_data', repeat=5):
+	"""Returns the fastest of repeat imports of a module, in seconds, each in a fresh interpreter started in the repository root."""
+	code = 'import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)'.format(module)
+	return min(float(subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout) for _ in range(repeat))
+
+def run(scales=('qualifier', 'region'), repeat=1, seed=0):
+	"""
+	Benchmarks every stage at each scale, returning one result dict per scale and stage.
+
+	Each scale runs in its own temporary directory with the default storage, see storage.default_backend.
+
+	Args:
+		scales: names from SCALES
+		repeat: times to run each stage, keeping the fastest
+		seed: random seed of the synthetic seasons
+	"""
+	meta = {
+		'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+		'pandas': pd.__version__, 'numpy': np.__version__, 'repeat': repeat, 'seed': seed
+		}
+	results = []
+	cwd, backend = os.getcwd(), storage.backend
+	for scale in scales:
+		season = SyntheticSeason(seed=seed, **SCALES[scale])
+		folder = tempfile.mkdtemp(prefix='ftc-bench-')
+		try:
+			os.chdir(folder)
+			storage.use(storage.default_backend())
+			times, rows = bench_season(season, repeat)
+		finally:
+			os.chdir(cwd)
+			storage.use(backend)
+			shutil.rmtree(folder, ignore_errors=True)
+		for stage, seconds in times.items():
+			results.append({
+				**meta, 'scale': scale, 'events': len(season.events), 'teams': len(season.team_numbers),
+				'rows': rows, 'stage': stage, 'seconds': seconds
+				})
+	return results
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmarks the statistics pipeline on synthetic seasons.')
+	parser.add_argument('--scales', nargs='+', default=['qualifier', 'region'], choices=list(SCALES))
+	parser.add_argument('--repeat', type=int, default=1, help='times to run each stage, keeping the fastest')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--output', help='JSON lines file to append results to, printed if not given')
+	parser.add_argument('--import-budget', type=float, help='only check that importing ftc_data takes at most this many seconds, exiting 1 if not')
+	args = parser.parse_args(argv)
+
+	if args.import_budget is not None:
+		seconds = import_time()
+		print(json.dumps({'stage': 'import ftc_data', 'seconds': seconds, 'budget': args.import_budget}))
+		sys.exit(0 if seconds <= args.import_budget else 1)
+
+	results = run(args.scales, args.repeat, args.seed)
+	lines = [json.dumps(result) for result in results]
+	if args.output:
+		with open(args.output, 'a') as f:
+			f.write('\n'.join(lines) + '\n')
+	else:
+		print('\n'.join(lines))
+	summary = pd.DataFrame(results).pivot_table(index='stage', columns='scale', values='seconds', sort=False)
+	print(summary[args.scales].round(4).to_string(), file=sys.stderr)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,148 @@
+﻿import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from src.ftc_api.ftc_requests import FtcRequests
+
+# Scored elements in API order, with their points
+elements = {
+	'autoSampleNet': 2, 'autoSampleLow': 4, 'autoSampleHigh': 8, 'autoSpecimenLow': 6, 'autoSpecimenHigh': 10,
+	'teleopSampleNet': 2, 'teleopSampleLow': 4, 'teleopSampleHigh': 8, 'teleopSpecimenLow': 6, 'teleopSpecimenHigh': 10
+	}
+# Share of a team's bucket or specimen scoring that goes to each element
+bucket_shares = {'autoSampleNet': 0.2, 'autoSampleLow': 0.05, 'autoSampleHigh': 0.3, 'teleopSampleNet': 0.6, 'teleopSampleLow': 0.2, 'teleopSampleHigh': 1.2}
+specimen_shares = {'autoSpecimenLow': 0.05, 'autoSpecimenHigh': 0.4, 'teleopSpecimenLow': 0.2, 'teleopSpecimenHigh': 1.4}
+auto_locations = ['NONE', 'OBSERVATION_ZONE', 'ASCENT']
+auto_points = {'NONE': 0, 'OBSERVATION_ZONE': 3, 'ASCENT': 3}
+ascents = ['NONE', 'OBSERVATION_ZONE', 'ASCENT_1', 'ASCENT_2', 'ASCENT_3']
+ascent_points = {'NONE': 0, 'OBSERVATION_ZONE': 3, 'ASCENT_1': 5, 'ASCENT_2': 15, 'ASCENT_3': 30}
+stations = ['Red1', 'Red2', 'Blue1', 'Blue2']
+# Double elimination between four alliances: (red, blue) seeds, or ('W'/'L', series) for a winner or loser
+bracket = [(1, 4), (2, 3), (('L', 1), ('L', 2)), (('W', 1), ('W', 2)), (('L', 4), ('W', 3)), (('W', 4), ('W', 5))]
+
+class SyntheticSeason:
+	"""
+	A made up Into the Deep season, served in the same shapes as FtcRequests.
+
+	Each team has a skill and a bucket or specimen playing style that drive its scoring, so
+	alliances, OPR and disaggregation behave like a real season. Every event plays a balanced
+	qualifier schedule followed by a four alliance double elimination playoff.
+
+	Event data is generated on request from a per event seed, so large seasons are never held in
+	memory at once and the same season always produces the same data.
+
+	Args:
+		n_events: number of events
+		teams_per_event: teams attending each event
+		matches_per_team: qualifier matches each team plays at an event
+		n_teams: teams in the season, by default enough for each team to attend about two events
+		seed: random seed
+	"""
+	def __init__(self, n_events=1, teams_per_event=24, matches_per_team=5, n_teams=None, seed=0):
+		rng = np.random.default_rng(seed)
+		n_teams = max(teams_per_event, n_teams or n_events * teams_per_event // 2)
+		self.seed = seed
+		self.matches_per_team = matches_per_team
+		self.team_numbers = rng.choice(np.arange(100, 100 + 10 * n_teams), n_teams, replace=False)
+		self.skill = rng.gamma(2.0, 0.5, n_teams)
+		self.style = rng.beta(0.5, 0.5, n_teams)
+
+		start = datetime(2024, 10, 5)
+		scrimmage = rng.random(n_events) < 0.15
+		self.events = pd.DataFrame({
+			'code': ['SYN{:04d}{}'.format(i, 'S' if s else 'Q') for i, s in enumerate(scrimmage)],
+			'name': ['Synthetic Event {}'.format(i) for i in range(n_events)],
+			'type': np.where(scrimmage, 'Scrimmage', 'Qualifier'),
+			'city': 'Anytown',
+			'date': [(start + timedelta(weeks=int(w))).strftime('%Y-%m-%dT00:00:00') for w in np.sort(rng.integers(0, 20, n_events))]
+			})
+		self.event_teams = {code: np.sort(rng.choice(n_teams, teams_per_event, replace=False)) for code in self.events.code}
+
+	# FtcRequests interface
+	def get_event_teams(self, event_code, year=2024):
+		return {int(self.team_numbers[t]): 'Team {}'.format(self.team_numbers[t]) for t in self.event_teams[event_code]}
+
+	def get_event_data(self, event_code, year=2024):
+		return FtcRequests.frame_event_data(*self.event_bodies(event_code))
+
+	def get_events_data(self, event_codes, year=2024):
+		for code in event_codes:
+			yield self.get_event_data(code, year)
+
+	def get_event_schedule(self, event_code, year=2024):
+		matches = self.event_bodies(event_code)[0]['matches']
+		columns = ['description', 'tournamentLevel', 'series', 'matchNumber', 'teams']
+		return pd.DataFrame([{k: m[k] for k in columns} for m in matches if m['tournamentLevel'] == 'QUALIFICATION'])
+
+	# Generation
+	def robot_play(self, rng, team):
+		"""Returns the element counts, auto location and ascent of one robot in one match."""
+		skill, style = self.skill[team], self.style[team]
+		counts = {k: 0 for k in elements}
+		counts.update({k: rng.poisson(skill * style * share) for k, share in bucket_shares.items()})
+		counts.update({k: rng.poisson(skill * (1 - style) * share) for k, share in specimen_shares.items()})
+		location = auto_locations[rng.choice(3, p=[0.5, 0.3, 0.2]) if rng.random() < min(0.9, skill / 2) else 0]
+		ascent = ascents[min(4, rng.poisson(skill))]
+		return counts, location, ascent
+
+	def alliance(self, rng, color, teams):
+		"""Returns an alliance score breakdown as served by the API, before opposing fouls."""
+		plays = [self.robot_play(rng, team) for team in teams]
+		a = {'alliance': color, 'team': 0}
+		for robot, (counts, location, ascent) in enumerate(plays, 1):
+			a['robot{}Auto'.format(robot)] = location
+			a['robot{}Teleop'.format(robot)] = ascent
+		for k in elements:
+			a[k] = sum(counts[k] for counts, _, _ in plays)
+		a['minorFouls'] = int(rng.poisson(0.5))
+		a['majorFouls'] = int(rng.poisson(0.1))
+		a['autoPoints'] = sum(elements[k] * a[k] for k in elements if k.startswith('auto')) + sum(auto_points[l] for _, l, _ in plays)
+		a['teleopPoints'] = sum(elements[k] * a[k] for k in elements if k.startswith('teleop')) + sum(ascent_points[e] for _, _, e in plays)
+		a['prePenaltyTotal'] = a['autoPoints'] + a['teleopPoints']
+		return a
+
+	def play(self, rng, matches, scores, level, series, number, red, blue, start):
+		"""Plays a match between two alliances of team indexes, adding it to the match and score lists."""
+		alliances = [self.alliance(rng, 'Red', red), self.alliance(rng, 'Blue', blue)]
+		red_score, blue_score = alliances
+		red_score['foulPointsCommitted'] = 5 * red_score['minorFouls'] + 15 * red_score['majorFouls']
+		blue_score['foulPointsCommitted'] = 5 * blue_score['minorFouls'] + 15 * blue_score['majorFouls']
+		red_score['totalPoints'] = red_score['prePenaltyTotal'] + blue_score['foulPointsCommitted']
+		blue_score['totalPoints'] = blue_score['prePenaltyTotal'] + red_score['foulPointsCommitted']
+		stamp = (start + timedelta(minutes=7 * len(matches))).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
+		matches.append({
+			'actualStartTime': stamp, 'description': '{} {}'.format(level.title(), series or number),
+			'tournamentLevel': level, 'series': series, 'matchNumber': number,
+			'scoreRedFinal': red_score['totalPoints'], 'scoreRedFoul': blue_score['foulPointsCommitted'], 'scoreRedAuto': red_score['autoPoints'],
+			'scoreBlueFinal': blue_score['totalPoints'], 'scoreBlueFoul': red_score['foulPointsCommitted'], 'scoreBlueAuto': blue_score['autoPoints'],
+			'postResultTime': stamp, 'modifiedOn': stamp,
+			'teams': [{'teamNumber': int(self.team_numbers[t]), 'station': s, 'dq': False, 'onField': True} for t, s in zip(list(red) + list(blue), stations)]
+			})
+		scores.append({'matchLevel': level, 'matchSeries': series, 'matchNumber': number, 'randomization': 1, 'alliances': alliances})
+		return red_score['totalPoints'] - blue_score['totalPoints']
+
+	def event_bodies(self, event_code):
+		"""Returns the decoded API match, qualifier score and playoff score bodies of an event."""
+		index = int(self.events.index[self.events.code == event_code][0])
+		rng = np.random.default_rng([self.seed, index])
+		teams = self.event_teams[event_code]
+		start = datetime.fromisoformat(self.events.date[index]) + timedelta(hours=10)
+		matches, quals, playoffs = [], [], []
+
+		# Each match takes the four teams that have played least
+		played = np.zeros(len(teams), dtype=int)
+		points = np.zeros(len(teams))
+		for number in range(1, -(-len(teams) * self.matches_per_team // 4) + 1):
+			picked = np.lexsort((rng.random(len(teams)), played))[:4]
+			margin = self.play(rng, matches, quals, 'QUALIFICATION', 0, number, teams[picked[:2]], teams[picked[2:]], start)
+			played[picked] += 1
+			points[picked] += [margin, margin, -margin, -margin]
+
+		if len(teams) >= 8:
+			ranked = teams[np.argsort(-points / np.maximum(played, 1), kind='stable')]
+			seeds = {seed: ranked[[seed - 1, seed + 3]] for seed in range(1, 5)}
+			results = {}
+			for series, (red, blue) in enumerate(bracket, 1):
+				red, blue = [seed if isinstance(seed, int) else results[seed] for seed in (red, blue)]
+				margin = self.play(rng, matches, playoffs, 'PLAYOFF', series, 1, seeds[red], seeds[blue], start)
+				results[('W', series)], results[('L', series)] = (red, blue) if margin >= 0 else (blue, red)
+		return {'matches': matches}, {'matchScores': quals}, {'matchScores': playoffs}
@@ -1,15 +1,20 @@
 ﻿import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
 import pandas as pd
 import os
+import threading
+import time
+from src.ftc_api.response_cache import ResponseCache
+from src.ftc_api.scheduler import BACKFILL, DEFAULT, LIVE, RequestScheduler
+from src.instrument import instrument
+from src.storage import storage
 
 ### Helpers
-def pickle_df_to_folder(file_path, df):
-	"""Pickles a DataFrame, creating the folder if it doesn't exist."""
-	directory = os.path.dirname(file_path)
-	os.makedirs(directory, exist_ok=True)
-	df.to_pickle(file_path)
-
 def change_authorization():
 	user = input("Enter new username: ")
 	api_key = input("Enter new API key: ")
@@ -22,7 +27,16 @@ class FtcRequests:
 	"""
 	Connects the FTC Event API to a local database.
 
-	Requires user to use their own API key.
+	Requires user to use their own API key, read on the first request, see connect.
+
+	Requests are sent through a scheduler that rate limits them, times them out and retries them,
+	sending live event data ahead of backfill traffic, see RequestScheduler.
+
+	Args:
+		max_workers: maximum number of requests in flight at once
+		server: API root, overridable for local testing
+		cache_dir: folder for the conditional GET response cache, or None to disable it
+		scheduler: RequestScheduler to send requests through, one with default limits if None
 	"""
 
 	# static values
@@ -33,19 +47,103 @@ class FtcRequests:
 		'description', 'modifiedOn', 'actualStartTime', 'scoreRedFinal', 'scoreRedFoul', 'scoreRedAuto', 'scoreBlueFinal', 
 		'scoreBlueFoul', 'scoreBlueAuto'
 		]
+	# Events that started this long ago are final, responses cached since are served without revalidating
+	COMPLETED_AFTER = timedelta(days=7)
 	# script_dir = os.path.dirname(os.path.abspath(__file__))
 
 
 
-	def __init__(self):
-		if not os.path.exists("src/ftc_api/.auth") and not os.path.exists("src/ftc_api/.api-key"):
-			change_authorization()
+	def __init__(self, max_workers=8, server=None, cache_dir='data/cache', scheduler=None):
+		if server is not None:
+			self.SERVER = server
+		self.max_workers = max_workers
+		self.scheduler = scheduler or RequestScheduler(max_in_flight=max_workers)
+		# Opened by connect on the first request
+		self.session = None
+		self.lock = threading.Lock()
+		self.cache = ResponseCache(cache_dir) if cache_dir is not None else None
+
+	def connect(self):
+		"""
+		Returns the keep-alive session shared by every request, sized to the worker count.
+
+		The API credentials are read, or asked for if they were never saved, when the first request
+		opens it, so cached responses and offline use never need them.
+		"""
+		with self.lock:
+			if self.session is not None:
+				return self.session
+			if not os.path.exists("src/ftc_api/.auth") and not os.path.exists("src/ftc_api/.api-key"):
+				change_authorization()
+
+			with open("src/ftc_api/.api-key", 'r', encoding='utf-8-sig') as api_file:
+				self.API_KEY = api_file.read().strip()
+			with open("src/ftc_api/.auth", 'r', encoding='utf-8-sig') as auth_file:
+				self.USER = auth_file.read().strip()
+			self.HEADERS = {'Accept': 'application/json', 'Authorization': self.API_KEY}
+
+			session = requests.Session()
+			session.auth = HTTPBasicAuth(self.USER, self.API_KEY)
+			session.headers.update(self.HEADERS)
+			adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+			session.mount('https://', adapter)
+			session.mount('http://', adapter)
+			self.session = session
+			return session
+
+	def get(self, path, params=None, ttl=0, priority=DEFAULT):
+		"""
+		Returns the decoded JSON body of an API path e.g. 'v2.0/2024/events'.
+
+		Cached responses younger than ttl seconds are returned without a request, older ones
+		are revalidated with a conditional GET. Requests go out in priority order, see RequestScheduler.
+		Raises requests.HTTPError, with the status and URL, for an error response, e.g. a 429 or 5xx
+		still failing once its retries run out.
+		"""
+		url = self.SERVER + path
+		if self.cache is None:
+			query = self.fetch(url, params, priority=priority)
+			query.raise_for_status()
+			return query.json()
+
+		entry, age = self.cache.load(url, params)
+		if entry is not None and age < ttl:
+			self.cache.count('hits')
+			return entry['body']
+		query = self.fetch(url, params, self.cache.validators(entry) if entry else None, priority)
+		if entry is not None and query.status_code == 304:
+			self.cache.count('revalidated')
+			self.cache.touch(url, params)
+			return entry['body']
+		self.cache.count('misses')
+		query.raise_for_status()
+		body = query.json()
+		self.cache.store(url, params, body, query.headers)
+		return body
+
+	def fetch(self, url, params=None, headers=None, priority=DEFAULT):
+		"""Sends a GET request through the scheduler, reporting the size and latency of every attempt to the instrumentation sinks."""
+		session = self.connect()
+		def send(timeout):
+			start = time.perf_counter()
+			query = session.get(url, params=params, headers=headers, timeout=timeout)
+			instrument.http(url, query.status_code, len(query.content), time.perf_counter() - start)
+			return query
+		return self.scheduler.request(send, url, priority)
+
+	def completed_events(self, year=2024):
+		"""
+		Returns when each locally known event that is complete became final, by event code.
 
-		with open("src/ftc_api/.api-key", 'r', encoding='utf-8-sig') as api_file:
-			self.API_KEY = api_file.read().strip()
-		with open("src/ftc_api/.auth", 'r', encoding='utf-8-sig') as auth_file:
-			self.USER = auth_file.read().strip()
-		self.HEADERS = {'Accept': 'application/json', 'Authorization': self.API_KEY}
+		Responses cached since an event became final never go stale, older ones may have been
+		cached while it was still being scored.
+		"""
+		ef = storage.read('events', year)
+		if ef.empty:
+			return {}
+		final = pd.to_datetime(ef.date) + self.COMPLETED_AFTER
+		done = final < datetime.now()
+		return dict(zip(ef.code[done], final[done]))
 
 	def get_region_events(self, region='USPA', year=2024):
 		"""
@@ -55,13 +153,12 @@ class FtcRequests:
 			region: 4 character region code e.g. 'USPA'
 			year: year of comeptetion kickoff
 		"""
-		query = requests.get(self.SERVER + "v2.0/{}/events".format(year), auth=HTTPBasicAuth(self.USER, self.API_KEY), headers=self.HEADERS)
-		ef = pd.DataFrame(query.json()['events'])
+		ef = pd.DataFrame(self.get("v2.0/{}/events".format(year))['events'])
 		ef = ef[ef.code.str[:4] == region]
 		ef = ef[ef.typeName.isin(['Scrimmage', 'Qualifier', 'Championship'])]
 		ef = ef.drop(columns=ef.columns.intersection(self.FILLER),axis=1)
 		ef = ef.sort_values(by='dateStart').reset_index(drop=True).rename(columns={'typeName':'type', 'dateStart':'date'})
-		pickle_df_to_folder('data/{}/events.pkl'.format(year),ef)
+		storage.write('events', ef, year)
 		return ef
 
 	def get_event_teams(self, event_code, year=2024):
@@ -73,38 +170,75 @@ class FtcRequests:
 			year: year of comeptetion kickoff
 		"""
 		params = {"eventCode" : event_code}
-		query = requests.get(self.SERVER + "v2.0/{}/teams".format(year), auth=HTTPBasicAuth(self.USER, self.API_KEY), headers=self.HEADERS, params=params)
-		tf = pd.DataFrame(query.json()['teams'])
+		tf = pd.DataFrame(self.get("v2.0/{}/teams".format(year), params)['teams'])
 		return dict(zip(tf.teamNumber, tf.nameShort))
-	
-	def get_event_data(self, event_code, year=2024):
+
+	def get_event_schedule(self, event_code, year=2024):
 		"""
-		Returns event qualifier, match, and playoff dataframes.
+		Returns the qualifier schedule of an event, one row per match with its 'teams' JSON, including
+		matches that were not played yet.
 
 		Args:
 			event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
 			year: year of comeptetion kickoff
 		"""
-		query = requests.get(self.SERVER + "v2.0/{}/matches/{}".format(year,event_code), auth=HTTPBasicAuth(self.USER, self.API_KEY), headers=self.HEADERS)
-		mf = pd.DataFrame(query.json()['matches'])
-		mf = mf.drop(columns=mf.columns.intersection(self.FILLER),axis=1)
-		query = requests.get(self.SERVER + "v2.0/{}/scores/{}/qual".format(year,event_code), auth=HTTPBasicAuth(self.USER, self.API_KEY), headers=self.HEADERS)
-		qf = pd.DataFrame(query.json()['matchScores'])
+		return pd.DataFrame(self.get("v2.0/{}/schedule/{}".format(year, event_code), {'tournamentLevel': 'qual'})['schedule'])
+	
+	def event_paths(self, event_code, year=2024):
+		"""Returns the match, qualifier score, and playoff score API paths of an event."""
+		return [
+			"v2.0/{}/matches/{}".format(year, event_code),
+			"v2.0/{}/scores/{}/qual".format(year, event_code),
+			"v2.0/{}/scores/{}/playoff".format(year, event_code)
+			]
+
+	@classmethod
+	def frame_event_data(cls, matches, quals, playoffs):
+		"""Returns event qualifier, match, and playoff dataframes from decoded API bodies."""
+		mf = pd.DataFrame(matches['matches'])
+		# modifiedOn is kept to tell when a match was scored or rescored
+		mf = mf.drop(columns=mf.columns.intersection(cls.FILLER).drop('modifiedOn', errors='ignore'),axis=1)
+		qf = pd.DataFrame(quals['matchScores'])
 		qf = qf.drop(columns=qf.columns.intersection(['randomization']))
-		query = requests.get(self.SERVER + "v2.0/{}/scores/{}/playoff".format(year,event_code), auth=HTTPBasicAuth(self.USER, self.API_KEY), headers=self.HEADERS)
-		pf = pd.DataFrame(query.json()['matchScores'])
+		pf = pd.DataFrame(playoffs['matchScores'])
 		pf = pf.drop(columns=pf.columns.intersection(['randomization']))
 		return {'mf':mf, 'qf':qf, 'pf':pf}
+
+	def get_event_data(self, event_code, year=2024):
+		"""
+		Returns event qualifier, match, and playoff dataframes.
+
+		Args:
+			event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+			year: year of comeptetion kickoff
+		"""
+		return next(self.get_events_data([event_code], year))
 	
-	def get_events_data(self, event_codes, year=2024):
+	def get_events_data(self, event_codes, year=2024, priority=None):
 		"""
-		Returns a list of event qualifier, match, and playoff dataframes.
+		Yields the event qualifier, match, and playoff dataframes of each event, in order, as they arrive.
+
+		Endpoints are fetched concurrently, at most max_workers at a time, for only as many events
+		ahead of the one being consumed as it takes to keep every worker busy. Memory holds the
+		responses of those few events however many are requested.
+		Completed events are served from the response cache once fetched or revalidated after they
+		became final, see completed_events.
 
 		Args:
 			event_code: list of alphanumeric event identifier strings e.g. ['USPAPHQ1', 'USPAPHQ2']
 			year: year of comeptetion kickoff
+			priority: scheduler priority of the requests, by default LIVE for events still going on and BACKFILL for completed ones
 		"""
-		match_data = []
-		for code in event_codes:
-			match_data.append(self.get_event_data(code, year))
-		return match_data
\ No newline at end of file
+		with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+			completed = self.completed_events(year)
+			now = datetime.now()
+			def submit(code):
+				# Entries younger than the time since the event became final were cached after it
+				ttl, level = ((now - completed[code]).total_seconds(), BACKFILL) if code in completed else (0, LIVE)
+				return [pool.submit(self.get, path, None, ttl, level if priority is None else priority) for path in self.event_paths(code, year)]
+			codes = iter(event_codes)
+			queries = deque(submit(code) for code in islice(codes, self.max_workers // 3 + 1))
+			while queries:
+				event = queries.popleft()
+				queries.extend(submit(code) for code in islice(codes, 1))
+				yield self.frame_event_data(*[q.result() for q in event])
\ No newline at end of file
@@ -0,0 +1,87 @@
+﻿import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from datetime import datetime
+from email.utils import format_datetime
+
+### Helpers
+def latest_modified_on(body):
+	"""Returns the newest 'modifiedOn' of a decoded API body as an HTTP date, or None."""
+	stamps = [r['modifiedOn'] for v in body.values() if isinstance(v, list) for r in v if isinstance(r, dict) and r.get('modifiedOn')]
+	try:
+		return format_datetime(datetime.fromisoformat(max(stamps)[:19]), usegmt=False) if stamps else None
+	except ValueError:
+		return None
+
+class ResponseCache:
+	"""
+	On-disk cache of decoded FTC API responses and their validators.
+
+	Each URL and parameter set is pickled to its own file, holding the decoded body with the
+	ETag and Last-Modified it was served with. The file mtime records when the entry was last
+	confirmed fresh, so a 304 only touches the file.
+
+	Args:
+		directory: folder to keep the cache in
+	"""
+	def __init__(self, directory='data/cache'):
+		self.directory = directory
+		self.hits = 0
+		self.revalidated = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+		os.makedirs(directory, exist_ok=True)
+
+	def path(self, url, params=None):
+		key = url + '?' + '&'.join('{}={}'.format(k, v) for k, v in sorted((params or {}).items()))
+		return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+	def load(self, url, params=None):
+		"""Returns the cached entry and its age in seconds, or (None, None)."""
+		path = self.path(url, params)
+		try:
+			with open(path, 'rb') as f:
+				return pickle.load(f), time.time() - os.path.getmtime(path)
+		except (OSError, EOFError, pickle.UnpicklingError):
+			return None, None
+
+	def store(self, url, params, body, headers):
+		entry = {
+			'url': url,
+			'params': params,
+			'body': body,
+			'etag': headers.get('ETag'),
+			'last_modified': headers.get('Last-Modified') or latest_modified_on(body)
+			}
+		# A temporary file of its own, as threads and processes sharing the cache may store the same URL at once
+		fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+			os.replace(temp, self.path(url, params))
+		except BaseException:
+			os.remove(temp)
+			raise
+
+	def touch(self, url, params=None):
+		os.utime(self.path(url, params))
+
+	def validators(self, entry):
+		"""Returns the conditional request headers for a cached entry."""
+		headers = {}
+		if entry['etag']:
+			headers['If-None-Match'] = entry['etag']
+		if entry['last_modified']:
+			headers['If-Modified-Since'] = entry['last_modified']
+		return headers
+
+	def count(self, counter):
+		with self.lock:
+			setattr(self, counter, getattr(self, counter) + 1)
+
+	def stats(self):
+		"""Returns the hit, revalidation and miss counters."""
+		return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses}
@@ -0,0 +1,222 @@
+﻿import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import numpy as np
+import requests
+
+# Request priorities, lower goes first
+LIVE = 0
+DEFAULT = 1
+BACKFILL = 2
+priorities = {'live': LIVE, 'default': DEFAULT, 'backfill': BACKFILL}
+# Rate limited, or the server or a proxy in front of it failing, worth trying again
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+### Helpers
+def retry_after(response):
+	"""Returns the seconds a response's Retry-After header asks to wait, or None."""
+	try:
+		return max(0.0, float(response.headers.get('Retry-After')))
+	except (TypeError, ValueError):
+		return None
+
+class TokenBucket:
+	"""
+	Limits the rate of requests to a host while allowing short bursts.
+
+	Holds up to burst tokens, refilled at rate per second, and each request takes one. Not
+	thread-safe on its own, RequestScheduler only uses it under its lock.
+
+	Args:
+		rate: tokens added per second, or None for no limit
+		burst: most tokens held at once
+	"""
+	def __init__(self, rate=20.0, burst=20):
+		self.rate = rate
+		self.burst = burst
+		self.tokens = float(burst)
+		self.updated = time.monotonic()
+		self.paused_until = 0.0
+
+	def take(self, now=None):
+		"""Takes a token and returns 0, or returns the seconds until one is available without taking it."""
+		now = time.monotonic() if now is None else now
+		if now < self.paused_until:
+			return self.paused_until - now
+		if self.rate is None:
+			return 0.0
+		self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		if self.tokens >= 1:
+			self.tokens -= 1
+			return 0.0
+		return (1 - self.tokens) / self.rate
+
+	def pause(self, seconds, now=None):
+		"""Gives out no tokens for a while, e.g. after the host answered 429, and drops those saved up for a burst."""
+		now = time.monotonic() if now is None else now
+		self.paused_until = max(self.paused_until, now + seconds)
+		self.tokens = 0.0
+		self.updated = self.paused_until
+
+class Host:
+	"""A host's token bucket, the priority heap of requests waiting for it, and its requests in flight."""
+	def __init__(self, bucket: TokenBucket):
+		self.bucket = bucket
+		self.waiting = []
+		self.in_flight = 0
+
+class RequestScheduler:
+	"""
+	Sends requests to each host in priority order, within its rate limit and concurrency, retrying
+	those that time out, fail to connect or get a retryable status.
+
+	A request goes once it is the highest priority one waiting for its host, ties going to the
+	oldest, fewer than max_in_flight requests to the host are in flight and the host's token bucket
+	has a token. Failures are retried after a jittered exponential backoff: backoff * 2**attempt
+	seconds, capped at max_backoff and scaled by a random factor between 0.5 and 1, or the
+	Retry-After the server asked for. A 429 pauses the host's bucket for that long, so every request
+	to the host backs off, not only the one that was refused, and retries keep their priority.
+
+	Args:
+		rate: requests per second to each host, or None for no limit
+		burst: requests a host may get at once after being idle
+		max_in_flight: most requests in flight to each host at once
+		timeout: seconds to connect and to wait between bytes of the response, see requests
+		retries: attempts after the first before giving up
+		backoff: seconds before the first retry
+		max_backoff: longest wait between attempts
+		window: most recent requests kept for the wait and latency percentiles
+	"""
+	def __init__(self, rate=20.0, burst=20, max_in_flight=8, timeout=(5, 30), retries=4, backoff=0.5, max_backoff=30.0, window=1000):
+		self.rate = rate
+		self.burst = burst
+		self.max_in_flight = max_in_flight
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.hosts = {}
+		self.order = itertools.count()
+		self.condition = threading.Condition()
+		self.counts = dict.fromkeys(['requests', 'retries', 'throttled', 'server_errors', 'timeouts', 'connection_errors', 'failed'], 0)
+		self.max_queued = 0
+		self.waits = deque(maxlen=window)
+		self.latencies = deque(maxlen=window)
+
+	def host(self, url):
+		name = urlsplit(url).netloc
+		if name not in self.hosts:
+			self.hosts[name] = Host(TokenBucket(self.rate, self.burst))
+		return self.hosts[name]
+
+	@contextmanager
+	def slot(self, url, priority=DEFAULT):
+		"""Waits for a request's turn to its host, then holds one of its in flight slots within the block."""
+		with self.condition:
+			host = self.host(url)
+			ticket = (priority, next(self.order))
+			heapq.heappush(host.waiting, ticket)
+			self.max_queued = max(self.max_queued, sum(len(h.waiting) for h in self.hosts.values()))
+			start = time.perf_counter()
+			try:
+				while True:
+					if host.waiting[0] == ticket and host.in_flight < self.max_in_flight:
+						wait = host.bucket.take()
+						if not wait:
+							break
+						self.condition.wait(wait)
+					else:
+						self.condition.wait()
+			except BaseException:
+				host.waiting.remove(ticket)
+				heapq.heapify(host.waiting)
+				self.condition.notify_all()
+				raise
+			heapq.heappop(host.waiting)
+			host.in_flight += 1
+			self.waits.append(time.perf_counter() - start)
+			# The next request in line may go too
+			self.condition.notify_all()
+		try:
+			yield
+		finally:
+			with self.condition:
+				host.in_flight -= 1
+				self.condition.notify_all()
+
+	def delay(self, attempt, response=None):
+		"""Returns the seconds to wait before retrying a failed attempt, see RequestScheduler."""
+		seconds = retry_after(response) if response is not None else None
+		if seconds is None:
+			seconds = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1)
+		return seconds
+
+	def count(self, counter, latency=None):
+		with self.condition:
+			self.counts[counter] += 1
+			if latency is not None:
+				self.latencies.append(latency)
+
+	def request(self, send, url, priority=DEFAULT):
+		"""
+		Returns the response of send once the request's turn comes, trying again after each retryable
+		failure. Once retries run out, the last response is returned or the last error raised.
+
+		Args:
+			send: callable sending the request with the given requests timeout and returning its response
+			url: request URL, scheduled and rate limited by its host
+			priority: LIVE, DEFAULT or BACKFILL, lower goes first
+		"""
+		for attempt in itertools.count():
+			response = error = None
+			with self.slot(url, priority):
+				start = time.perf_counter()
+				try:
+					response = send(self.timeout)
+				except (requests.Timeout, requests.ConnectionError) as e:
+					error = e
+				self.count('requests', time.perf_counter() - start)
+			if isinstance(error, requests.Timeout):
+				self.count('timeouts')
+			elif error is not None:
+				self.count('connection_errors')
+			elif response.status_code == 429:
+				self.count('throttled')
+			elif response.status_code >= 500:
+				self.count('server_errors')
+			if error is None and response.status_code not in RETRY_STATUSES:
+				return response
+			if attempt >= self.retries:
+				self.count('failed')
+				if error is not None:
+					raise error
+				return response
+			self.count('retries')
+			seconds = self.delay(attempt, response)
+			if response is not None and response.status_code == 429:
+				with self.condition:
+					self.host(url).bucket.pause(seconds)
+			else:
+				time.sleep(seconds)
+
+	def stats(self):
+		"""
+		Returns the requests waiting, in total and by priority, and in flight, the most ever waiting,
+		the request, retry and failure counters, and the median and 95th percentile seconds requests
+		waited for their turn and took to answer.
+		"""
+		with self.condition:
+			waiting = [priority for host in self.hosts.values() for priority, _ in host.waiting]
+			stats = {'queued': len(waiting), **{'queued_' + name: waiting.count(p) for name, p in priorities.items()}}
+			stats.update({'in_flight': sum(host.in_flight for host in self.hosts.values()), 'max_queued': self.max_queued, **self.counts})
+			samples = {'wait': list(self.waits), 'latency': list(self.latencies)}
+		for name, values in samples.items():
+			p50, p95 = np.percentile(values, [50, 95]) if values else (0.0, 0.0)
+			stats[name + '_p50'], stats[name + '_p95'] = float(p50), float(p95)
+		return stats
\ No newline at end of file
@@ -0,0 +1,161 @@
+﻿import cProfile
+import functools
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+# Callables receiving each record, nothing is measured while empty
+sinks = []
+# Open stages, innermost last
+stack = []
+lock = threading.Lock()
+
+### Helpers
+def rows(value):
+	"""Returns the row count of a DataFrame, or of the first DataFrame in a tuple or list, else None."""
+	if isinstance(value, pd.DataFrame):
+		return len(value)
+	if isinstance(value, (tuple, list)):
+		for item in value:
+			if isinstance(item, pd.DataFrame):
+				return len(item)
+	return None
+
+def emit(record):
+	for sink in list(sinks):
+		sink(record)
+
+class JsonLinesSink:
+	"""
+	Appends each record to a JSON lines file.
+
+	Args:
+		path: file to append to
+	"""
+	def __init__(self, path):
+		self.path = path
+
+	def __call__(self, record):
+		with lock, open(self.path, 'a', encoding='utf-8') as f:
+			f.write(json.dumps(record, default=str) + '\n')
+
+class Stage:
+	"""
+	Measures one pipeline stage: wall time, rows in and out, peak memory, and the HTTP requests
+	sent while it was open. Emits a record to every sink on exit, and does nothing without sinks.
+
+	Peak memory is traced with tracemalloc while any sink is registered with memory tracking,
+	see recording. Nested stages each report their own peak.
+
+	Args:
+		name: stage name e.g. 'update_opr'
+		rows_in: rows the stage was given, if known
+	"""
+	def __init__(self, name, rows_in=None):
+		self.name = name
+		self.rows_in = rows_in
+		self.rows_out = None
+		self.active = False
+
+	def __enter__(self):
+		if not sinks:
+			return self
+		self.active = True
+		self.http = {'requests': 0, 'bytes': 0, 'seconds': 0.0}
+		self.peak = 0
+		if tracemalloc.is_tracing():
+			current, peak = tracemalloc.get_traced_memory()
+			if stack:
+				stack[-1].peak = max(stack[-1].peak, peak)
+			tracemalloc.reset_peak()
+			self.base = current
+		with lock:
+			stack.append(self)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		if not self.active:
+			return False
+		seconds = time.perf_counter() - self.start
+		with lock:
+			stack.remove(self)
+		record = {'type': 'stage', 'stage': self.name, 'seconds': seconds, 'rows_in': self.rows_in, 'rows_out': self.rows_out}
+		if tracemalloc.is_tracing():
+			self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+			record['peak_bytes'] = self.peak - self.base
+			if stack:
+				stack[-1].peak = max(stack[-1].peak, self.peak)
+		record.update({'http_' + k: v for k, v in self.http.items()})
+		record['failed'] = exc[0] is not None
+		emit(record)
+		return False
+
+def stage(fn):
+	"""Decorates a pipeline function to run as a Stage named after it, counting rows of its first argument and result."""
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		if not sinks:
+			return fn(*args, **kwargs)
+		with Stage(fn.__name__, rows(args[:1])) as s:
+			result = fn(*args, **kwargs)
+			s.rows_out = rows(result)
+			return result
+	return wrapper
+
+def http(url, status, size, seconds):
+	"""Records one HTTP request against every open stage, and as its own record."""
+	if not sinks:
+		return
+	with lock:
+		for s in stack:
+			s.http['requests'] += 1
+			s.http['bytes'] += size
+			s.http['seconds'] += seconds
+	emit({'type': 'http', 'url': url, 'status': status, 'bytes': size, 'seconds': seconds})
+
+@contextmanager
+def recording(*record_sinks, memory=True):
+	"""
+	Sends stage and HTTP records to the given sinks within the block.
+
+	Args:
+		record_sinks: callables receiving each record dict, e.g. list.append or a JsonLinesSink
+		memory: trace peak memory per stage, which slows the pipeline down
+	"""
+	trace = memory and not tracemalloc.is_tracing()
+	if trace:
+		tracemalloc.start()
+	sinks.extend(record_sinks)
+	try:
+		yield
+	finally:
+		for sink in record_sinks:
+			sinks.remove(sink)
+		if trace:
+			tracemalloc.stop()
+
+@contextmanager
+def profiled(path=None, top=25):
+	"""
+	Runs the block under cProfile.
+
+	Args:
+		path: file to dump the profile to for pstats or snakeviz, otherwise the top functions by
+			cumulative time are printed
+		top: number of functions to print
+	"""
+	profile = cProfile.Profile()
+	profile.enable()
+	try:
+		yield profile
+	finally:
+		profile.disable()
+		if path:
+			profile.dump_stats(path)
+		else:
+			pstats.Stats(profile).sort_stats('cumulative').print_stats(top)
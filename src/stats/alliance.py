@@ -0,0 +1,173 @@
+﻿import numpy as np
+import pandas as pd
+from src.stats import seasons
+from src.stats.predict import played_results
+from src.stats.stats import calculate_potentials, fit_codes
+from src.storage import storage
+
+# A robot's output when its partner plays the same scoring element, as they share it
+SHARE_FACTOR = 0.8
+# Captain's role in each fit, see fit_codes
+fit_names = {code: name for name, code in fit_codes.items()}
+
+def team_potentials(event_code, year=None):
+	"""
+	Returns each team's bucket and specimen potential at an event, and its points that don't depend
+	on its role, indexed by teamNumber.
+
+	Potentials come from the event's OPR, see calculate_potentials. Role independent points are the
+	team's average auto location, ascent and foul points.
+
+	Args:
+		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+		year: year of competition kickoff, the current season if None
+	"""
+	year = year or seasons.current.year
+	opr = storage.read('stats', year, events=[event_code]).set_index('teamNumber')
+	bucket, specimen = calculate_potentials(opr, '')
+	stats = storage.read('disagg_stats', year, events=[event_code])
+	base = (stats.location + stats.ascent + stats.Fouls) * stats.matchNumber
+	base = base.groupby(level='teamNumber').sum() / stats.matchNumber.groupby(level='teamNumber').sum()
+	potentials = pd.DataFrame({'Bucket': bucket, 'Specimen': specimen})
+	potentials['Base'] = base.reindex(potentials.index).fillna(0)
+	potentials.index = potentials.index.astype(int)
+	return potentials.sort_index()
+
+def pair_values(potentials: pd.DataFrame):
+	"""
+	Returns the projected points of every pair of teams playing together, and each pair's best fit,
+	as teams x teams arrays.
+
+	A pair either splits the scoring elements, one robot on buckets and the other on specimens, or
+	both play the same element, with the weaker robot's output reduced by SHARE_FACTOR. Fits are
+	the first robot's role, see fit_codes. A team paired with itself is worth nothing.
+
+	Args:
+		potentials: bucket, specimen and role independent points of each team, see team_potentials
+	"""
+	b = potentials.Bucket.to_numpy(dtype=float)
+	s = potentials.Specimen.to_numpy(dtype=float)
+	fits = np.stack([
+		b[:, None] + s[None, :],
+		s[:, None] + b[None, :],
+		np.maximum(b[:, None], b[None, :]) + SHARE_FACTOR * np.minimum(b[:, None], b[None, :]),
+		np.maximum(s[:, None], s[None, :]) + SHARE_FACTOR * np.minimum(s[:, None], s[None, :])
+		])
+	base = potentials.Base.to_numpy(dtype=float)
+	values = fits.max(axis=0) + base[:, None] + base[None, :]
+	np.fill_diagonal(values, 0)
+	return values, fits.argmax(axis=0)
+
+def alliance_value(values, alliance):
+	"""Returns the points of an alliance's best pair, the robots that would play, from pair_values."""
+	if len(alliance) < 2:
+		return 0.0
+	members = np.array(alliance)
+	return values[np.ix_(members, members)].max()
+
+def turns(n_alliances, alliance_size=2):
+	"""Returns the alliance seed choosing at each turn of a selection, in seed order then reverse order by round."""
+	return [seed for size in range(1, alliance_size) for seed in (range(n_alliances) if size % 2 else reversed(range(n_alliances)))]
+
+def next_turn(alliances, n_alliances, alliance_size=2):
+	"""Returns the seed of the alliance choosing next given the alliances chosen so far, or None once every alliance is full."""
+	alliances = list(alliances) + [[]] * (n_alliances - len(alliances))
+	for turn, seed in enumerate(turns(n_alliances, alliance_size)):
+		if len(alliances[seed]) < turn // n_alliances + 2:
+			return seed
+	return None
+
+def draft(values, order, n_alliances, alliance_size=2, alliances=(), pick=None):
+	"""
+	Returns the alliances of an alliance selection, as lists of team positions in the values matrix.
+
+	Alliances choose in seed order in the first round and in reverse order in the next, e.g. for a
+	third robot. A captain is the highest ranked team left when its alliance's turn comes, so
+	picking a team that would have been a later captain moves the other captains up. Every
+	captain picks the team that makes the best alliance with its current members.
+
+	Args:
+		values: projected points of every pair, see pair_values
+		order: team positions in ranking order
+		n_alliances: number of alliances
+		alliance_size: teams per alliance, captain included
+		alliances: alliances already chosen so far, as lists of team positions in seed order
+		pick: team position the next alliance to choose picks, instead of its best pick
+	"""
+	alliances = [list(a) for a in alliances] + [[] for _ in range(n_alliances - len(alliances))]
+	available = np.ones(len(values), dtype=bool)
+	available[[t for a in alliances for t in a]] = False
+	for turn, seed in enumerate(turns(n_alliances, alliance_size)):
+		alliance = alliances[seed]
+		if len(alliance) >= turn // n_alliances + 2:
+			continue
+		if not alliance:
+			captain = next((t for t in order if available[t]), None)
+			if captain is None:
+				break
+			alliance.append(captain)
+			available[captain] = False
+		if pick is None:
+			# The alliance's best pair once a candidate joins, for every candidate at once
+			best = np.maximum(values[alliance].max(axis=0), alliance_value(values, alliance))
+			best = np.where(available, best, -np.inf)
+			if not np.isfinite(best).any():
+				break
+			choice = int(best.argmax())
+		else:
+			choice, pick = pick, None
+		alliance.append(choice)
+		available[choice] = False
+	return alliances
+
+def pick_list(event_code, n_alliances=4, alliance_size=2, alliances=(), rankings=None, year=None):
+	"""
+	Returns every candidate for the next pick of an alliance selection, best first.
+
+	Each candidate is scored by simulating the rest of the draft after picking it, see draft. The
+	result holds the picking alliance's projected points right after the pick and once the draft is
+	over, the candidate's best fit with the captain, and the alliance's final rank among all of them.
+
+	Args:
+		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+		n_alliances: number of alliances
+		alliance_size: teams per alliance, captain included
+		alliances: team numbers of the alliances chosen so far, in seed order
+		rankings: team numbers in ranking order, ranked from the stored qualifiers if None
+		year: year of competition kickoff, the current season if None
+	"""
+	potentials = team_potentials(event_code, year)
+	values, fits = pair_values(potentials)
+	teams = potentials.index
+	if rankings is None:
+		rankings = event_rankings(event_code, year)
+	order = [t for t in teams.get_indexer(rankings) if t >= 0]
+	chosen = [list(teams.get_indexer(a)) for a in alliances]
+	chosen += [[] for _ in range(n_alliances - len(chosen))]
+
+	# The alliance choosing next, with the highest ranked team left as captain if it has none yet
+	seed = next_turn(chosen, n_alliances, alliance_size)
+	taken = {t for a in chosen for t in a}
+	captain = None if seed is None else chosen[seed][0] if chosen[seed] else next((t for t in order if t not in taken), None)
+	if captain is None:
+		return pd.DataFrame(columns=['teamNumber', 'Pick', 'Fit', 'Alliance', 'Alliance Rank'])
+	picker = chosen[seed] or [captain]
+	taken.add(captain)
+
+	rows = []
+	for candidate in range(len(teams)):
+		if candidate in taken:
+			continue
+		final = draft(values, order, n_alliances, alliance_size, chosen[:seed] + [picker] + chosen[seed + 1:], candidate)
+		strength = np.array([alliance_value(values, a) for a in final])
+		rows.append({
+			'teamNumber': teams[candidate], 'Pick': alliance_value(values, picker + [candidate]), 'Fit': fit_names[fits[captain, candidate]],
+			'Alliance': strength[seed], 'Alliance Rank': int((strength > strength[seed]).sum()) + 1
+			})
+	return pd.DataFrame(rows).sort_values(['Alliance', 'Pick'], ascending=False, kind='stable').reset_index(drop=True)
+
+def event_rankings(event_code, year=None):
+	"""Returns an event's team numbers in qualifier ranking order, by average ranking points then average non-penalty points."""
+	played = played_results(storage.read('matches', year or seasons.current.year, events=[event_code]))
+	score = played[['RP', 'npPts']].divide(played.Played, axis='index')
+	return list(score.sort_values(['RP', 'npPts'], ascending=False, kind='stable').index)
@@ -0,0 +1,131 @@
+﻿import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from src.ftc_api.ftc_requests import FtcRequests
+from src.stats import seasons
+from src.stats.report import Live_Report, prelooks, write_csv
+from src.stats.stats import update_statistics
+from src.storage import storage
+
+# Tables every Live_Report reads its event's rows from
+live_tables = ['matches', 'disagg_stats', 'disagg_matches']
+
+def upcoming_events(year=None, since=None):
+	"""
+	Returns the codes of the stored events dated on or after a day, in date order.
+
+	Args:
+		year: year of competition kickoff, the current season if None
+		since: ISO date e.g. '2024-11-23', today if None
+	"""
+	events = storage.read('events', year or seasons.current.year)
+	if events.empty:
+		return []
+	events = events[events.date.str[:10] >= (since or date.today().isoformat())]
+	return list(events.sort_values(['date', 'code']).code)
+
+def event_tables(event_codes, year=None):
+	"""
+	Returns a dict of event code to the rows of each live table for that event.
+
+	Each table is read once for all the events and split with a single groupby.
+
+	Args:
+		event_codes: list of alphanumeric event identifier strings
+		year: year of competition kickoff, the current season if None
+	"""
+	year = year or seasons.current.year
+	tables = {code: {} for code in event_codes}
+	for table in live_tables:
+		df = storage.read(table, year, events=event_codes)
+		if df.empty:
+			continue
+		codes = storage.level_values(df, 'eventCode').astype(object).to_numpy()
+		for code, rows in df.groupby(codes, sort=False):
+			tables[code][table] = rows
+	return tables
+
+def live_reports(event_codes, ftc_api: FtcRequests, team_dicts=None, update=True):
+	"""
+	Returns the Live_Report of each event that has statistics, sharing one update and one read of the tables.
+
+	Args:
+		event_codes: list of alphanumeric event identifier strings
+		ftc_api: source of the events' teams and matches
+		team_dicts: dict of event code to team dict, fetched for events not in it
+		update: update every event's statistics first in one call
+	"""
+	year = seasons.current.year
+	team_dicts = team_dicts or {}
+	if update:
+		update_statistics(event_codes, ftc_api)
+	tables = event_tables(event_codes, year)
+	return {
+		code: Live_Report(code, ftc_api, team_dicts.get(code), update=False, tables=tables[code])
+		for code in event_codes if len(tables[code]) == len(live_tables)
+		}
+
+def write_reports(reports, workers=8):
+	"""
+	Writes the CSVs of many reports from a thread pool, returning the paths written.
+
+	Only CSVs whose contents changed are written, see write_csv.
+
+	Args:
+		reports: iterable of Report
+		workers: threads writing at once
+	"""
+	outputs = [output for report in reports for output in report.outputs().items()]
+	for directory in set(os.path.dirname(path) for path, _ in outputs):
+		os.makedirs(directory, exist_ok=True)
+	with ThreadPoolExecutor(workers) as pool:
+		written = list(pool.map(lambda output: write_csv(output[1], output[0]), outputs))
+	return [path for (path, _), changed in zip(outputs, written) if changed]
+
+def batch_reports(event_codes=None, live=False, ftc_api: FtcRequests = None, team_dicts=None, update=True, workers=8):
+	"""
+	Builds and writes the Prelook, or Live_Report, of many events in one pass, returning the
+	reports by event code and the paths of the CSVs that changed.
+
+	Args:
+		event_codes: list of alphanumeric event identifier strings, the upcoming events if None
+		live: build live reports instead of prelooks
+		ftc_api: source of the events' teams and matches, FtcRequests if None
+		team_dicts: dict of event code to team dict, fetched for events not in it
+		update: with live, update the events' statistics first
+		workers: threads writing CSVs at once
+	"""
+	if event_codes is None:
+		event_codes = upcoming_events()
+	ftc_api = ftc_api or FtcRequests()
+	year = seasons.current.year
+	team_dicts = dict(team_dicts or {})
+	for code in event_codes:
+		if code not in team_dicts:
+			team_dicts[code] = ftc_api.get_event_teams(code, year)
+	if live:
+		reports = live_reports(event_codes, ftc_api, team_dicts, update)
+	else:
+		reports = prelooks({code: team_dicts[code] for code in event_codes})
+	written = write_reports(reports.values(), workers)
+	return reports, written
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Writes the scouting reports of many events at once.')
+	parser.add_argument('events', nargs='*', help='event codes, all upcoming stored events if none are given')
+	parser.add_argument('--since', help='with no event codes, the first day of upcoming events as YYYY-MM-DD, today by default')
+	parser.add_argument('--live', action='store_true', help='write live reports instead of prelooks')
+	parser.add_argument('--no-update', action='store_true', help='with --live, use the stored statistics')
+	parser.add_argument('--season', type=int, help='season year, see seasons.use')
+	parser.add_argument('--workers', type=int, default=8, help='threads writing CSVs at once')
+	args = parser.parse_args(argv)
+
+	if args.season:
+		seasons.use(args.season)
+	event_codes = args.events or upcoming_events(since=args.since)
+	reports, written = batch_reports(event_codes, args.live, update=not args.no_update, workers=args.workers)
+	print('{} reports for {} events, {} CSVs changed'.format(len(reports), len(event_codes), len(written)))
+
+if __name__ == '__main__':
+	main()
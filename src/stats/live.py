@@ -0,0 +1,120 @@
+﻿import time
+import pandas as pd
+from src.ftc_api.ftc_requests import FtcRequests
+from src.stats import seasons
+from src.stats.report import Live_Report
+from src.stats.stats import update_statistics
+
+### Helpers
+def scored_matches(mf: pd.DataFrame):
+	"""Returns a dict of (tournamentLevel, series, matchNumber) to modifiedOn for every match of a match frame."""
+	if mf.empty:
+		return {}
+	stamps = mf.modifiedOn if 'modifiedOn' in mf.columns else pd.Series(None, index=mf.index)
+	return dict(zip(zip(mf.tournamentLevel, mf.series, mf.matchNumber), stamps))
+
+class EventWatcher:
+	"""
+	Keeps an event's live report current by polling for newly scored matches.
+
+	Each poll fetches the event's matches and compares their modifiedOn to the previous poll. When a
+	match is new or rescored, the fetched data is pushed through update_statistics, which recomputes
+	only this event, and the live report is rebuilt. Report CSVs are only rewritten when they change.
+
+	Every processed match gets a latency record: the seconds from the start of the poll that saw it to
+	its reports being written.
+
+	Args:
+		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+		ftc_api: FtcRequests, or any feed with get_events_data and get_event_teams e.g. ReplayFeed
+		interval: seconds between the start of each poll
+	"""
+	def __init__(self, event_code, ftc_api: FtcRequests, interval=30):
+		self.code = event_code
+		self.ftc_api = ftc_api
+		self.interval = interval
+		self.team_dict = None
+		self.seen = {}
+		self.latencies = []
+		self.report = None
+
+	def poll(self):
+		"""Processes the matches scored since the last poll, returning their latency records."""
+		start = time.perf_counter()
+		event, = self.ftc_api.get_events_data([self.code], seasons.current.year)
+		stamps = scored_matches(event['mf'])
+		fresh = [key for key, stamp in stamps.items() if key not in self.seen or self.seen[key] != stamp]
+		if not fresh:
+			return []
+		if self.team_dict is None:
+			self.team_dict = self.ftc_api.get_event_teams(self.code, seasons.current.year)
+		update_statistics([self.code], self.ftc_api, event_data=[event])
+		self.report = Live_Report(self.code, self.ftc_api, self.team_dict, update=False)
+		written = self.report.to_csv()
+		latency = time.perf_counter() - start
+		self.seen.update(stamps)
+		records = [{
+			'tournamentLevel': level,
+			'series': series,
+			'matchNumber': number,
+			'modifiedOn': stamps[(level, series, number)],
+			'latency': latency,
+			'reports written': len(written)
+			} for level, series, number in fresh]
+		self.latencies.extend(records)
+		return records
+
+	def run(self, polls=None):
+		"""
+		Polls until stopped with Ctrl+C, returning a DataFrame of the latency of every processed match.
+
+		Args:
+			polls: stop after this many polls instead
+		"""
+		count = 0
+		try:
+			while polls is None or count < polls:
+				start = time.perf_counter()
+				for record in self.poll():
+					print("{} {} {}: {:.3f}s".format(self.code, record['tournamentLevel'], record['series'] or record['matchNumber'], record['latency']))
+				count += 1
+				if polls is None or count < polls:
+					time.sleep(max(0, self.interval - (time.perf_counter() - start)))
+		except KeyboardInterrupt:
+			pass
+		return pd.DataFrame(self.latencies)
+
+class ReplayFeed:
+	"""
+	Replays fetched event data as if its matches were being scored, to run an EventWatcher offline.
+
+	Each call to get_events_data reveals the next step matches of each event, in match frame order.
+
+	Args:
+		events: dict of event code to event data, see FtcRequests.get_event_data
+		team_dicts: dict of event code to its team names
+		step: matches revealed per fetch
+	"""
+	def __init__(self, events, team_dicts=None, step=1):
+		self.events = events
+		self.team_dicts = team_dicts or {}
+		self.step = step
+		self.revealed = {code: 0 for code in events}
+
+	def get_events_data(self, event_codes, year=2024):
+		data = []
+		for code in event_codes:
+			event = self.events[code]
+			self.revealed[code] = min(self.revealed[code] + self.step, len(event['mf']))
+			mf = event['mf'].iloc[:self.revealed[code]]
+			quals = mf[mf.tournamentLevel != 'PLAYOFF'].matchNumber
+			playoffs = mf[mf.tournamentLevel == 'PLAYOFF'].series
+			data.append({
+				'mf': mf,
+				'qf': event['qf'][event['qf'].matchNumber.isin(quals)] if not event['qf'].empty else event['qf'],
+				'pf': event['pf'][event['pf'].matchSeries.isin(playoffs)] if not event['pf'].empty else event['pf']
+				})
+		return data
+
+	def get_event_teams(self, event_code, year=2024):
+		return self.team_dicts.get(event_code, {})
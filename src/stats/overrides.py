@@ -0,0 +1,79 @@
+﻿import os
+import pandas as pd
+
+class OverrideStore:
+	"""
+	Fit overrides for alliance disaggregation, indexed in memory by (event, team, match, playoff).
+
+	Each event keeps a compacted CSV, overrides/<event>.csv, and an append-only log of newer edits,
+	overrides/<event>.log, so adding overrides during an event only appends lines. An event is
+	reread only when the size or mtime of either file changes.
+
+	Args:
+		directory: folder holding the override files
+	"""
+	COLUMNS = ['team_id', 'match_number', 'playoff', 'fit']
+	# Logs are folded into the CSV once they grow past this many bytes
+	COMPACT_BYTES = 16384
+
+	def __init__(self, directory='overrides'):
+		self.directory = directory
+		self.events = {}
+
+	def paths(self, event_code):
+		return [os.path.join(self.directory, event_code + '.csv'), os.path.join(self.directory, event_code + '.log')]
+
+	def stamp(self, event_code):
+		"""Returns the (mtime, size) of an event's CSV and log, None for a missing file."""
+		stamps = []
+		for path in self.paths(event_code):
+			try:
+				stat = os.stat(path)
+				stamps.append((stat.st_mtime_ns, stat.st_size))
+			except FileNotFoundError:
+				stamps.append(None)
+		return tuple(stamps)
+
+	def load(self, event_code):
+		"""Returns a dict of (team_id, match_number, playoff) to fit for an event, later log lines winning."""
+		stamp = self.stamp(event_code)
+		cached = self.events.get(event_code)
+		if cached is not None and cached[0] == stamp:
+			return cached[1]
+		fits = {}
+		for path, file_stamp in zip(self.paths(event_code), stamp):
+			if file_stamp is not None:
+				df = pd.read_csv(path)
+				keys = zip(df.team_id.astype(int), df.match_number.astype(int), df.playoff.astype(str) == 'True')
+				fits.update(zip(keys, df.fit))
+		self.events[event_code] = (stamp, fits)
+		return fits
+
+	def index(self, event_codes):
+		"""Returns a dict of (event, team_id, match_number, playoff) to fit across events."""
+		return {(code,) + key: fit for code in event_codes for key, fit in self.load(code).items()}
+
+	def add(self, event_code, overrides):
+		"""
+		Appends overrides for an event to its log.
+
+		Args:
+			event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+			overrides: list of (team_id, match_number, playoff, fit) tuples
+		"""
+		log = self.paths(event_code)[1]
+		os.makedirs(self.directory, exist_ok=True)
+		pd.DataFrame(overrides, columns=self.COLUMNS).to_csv(log, mode='a', header=not os.path.exists(log), index=False)
+		if os.path.getsize(log) > self.COMPACT_BYTES:
+			self.compact(event_code)
+
+	def compact(self, event_code):
+		"""Folds an event's log into its CSV."""
+		csv, log = self.paths(event_code)
+		fits = self.load(event_code)
+		df = pd.DataFrame([key + (fit,) for key, fit in fits.items()], columns=self.COLUMNS)
+		df.to_csv(csv + '.tmp', index=False)
+		os.replace(csv + '.tmp', csv)
+		if os.path.exists(log):
+			os.remove(log)
+		self.events.pop(event_code, None)
@@ -0,0 +1,160 @@
+﻿import numpy as np
+import pandas as pd
+from src.ftc_api.ftc_requests import FtcRequests
+from src.stats import seasons, team_index
+from src.stats.stats import calc_npPts, flatten_teams, stations
+from src.storage import storage
+
+# Ranking points of a qualifier win and tie
+win_rp = 2
+tie_rp = 1
+
+def team_strengths(event_code, teams, year=None):
+	"""
+	Returns the mean, deviation and fouls of each team's points per match, indexed by teamNumber.
+
+	Teams are rated on their matches at this event once they have any, otherwise on their season
+	potential from the team index. Teams without any data, or a deviation of 0 from a single
+	match, get the average of the rated teams.
+
+	Args:
+		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+		teams: team numbers to rate
+		year: year of competition kickoff, the current season if None
+	"""
+	year = year or seasons.current.year
+	columns = ['x̄ Pts', 'σ Pts', 'Fouls']
+	event = team_index.build(
+		storage.read('disagg_stats', year, events=[event_code]),
+		storage.read('disagg_matches', year, events=[event_code], columns=['teamNumber', 'tSMPH', 'tSPCH']),
+		storage.read('events', year)
+		)
+	rated = event[columns].combine_first(team_index.read(year, teams)[columns]).astype(float)
+	strengths = rated.reindex(pd.Index(sorted(teams), name='teamNumber'))
+	strengths['σ Pts'] = strengths['σ Pts'].replace(0, np.nan)
+	return strengths.fillna(rated.replace({'σ Pts': {0: np.nan}}).mean()).fillna(0)
+
+def played_results(matches: pd.DataFrame):
+	"""
+	Returns each team's qualifier matches played, ranking points and non-penalty points so far,
+	indexed by teamNumber.
+
+	Args:
+		matches: the event's stored match rows
+	"""
+	df = calc_npPts(matches[~matches.playoff.astype(bool)])
+	if df.empty:
+		return pd.DataFrame(columns=['Played', 'RP', 'npPts'], index=pd.Index([], name='teamNumber'))
+	won = df.groupby('matchNumber').win.transform('any')
+	df = df.assign(RP=np.where(df.win, win_rp, np.where(won, 0, tie_rp)))
+	played = df.groupby('teamNumber').agg(Played=('matchNumber', 'size'), RP=('RP', 'sum'), npPts=('npPts', 'sum'))
+	played.index = played.index.astype(int)
+	return played
+
+def remaining_schedule(schedule: pd.DataFrame, matches: pd.DataFrame):
+	"""
+	Returns the team number at each station of the scheduled qualifiers not played yet, indexed by matchNumber.
+
+	Args:
+		schedule: the event's qualifier schedule, see FtcRequests.get_event_schedule
+		matches: the event's stored match rows
+	"""
+	if schedule.empty:
+		return pd.DataFrame(columns=stations, index=pd.Index([], name='matchNumber'))
+	teams = flatten_teams(schedule).xs('QUALIFICATION', level='tournamentLevel')[stations].astype(int)
+	played = matches.matchNumber[~matches.playoff.astype(bool)] if not matches.empty else []
+	return teams[~teams.index.isin(played)].sort_index()
+
+def simulate(strengths: pd.DataFrame, schedule: pd.DataFrame, played: pd.DataFrame, samples=100_000, top=4, seed=None, chunk=20_000):
+	"""
+	Simulates the rest of an event's qualifiers, returning win probabilities of each remaining match and
+	projected final rankings.
+
+	Each sample draws every remaining alliance's points from a normal distribution with the sum of its
+	teams' means and variances, rounded to whole points. Ranking points and non-penalty points of
+	every sample are spread onto teams with one matrix product, then teams are ranked by average
+	ranking points, ties broken by average non-penalty points. Samples are drawn chunk at a time so
+	memory stays bounded.
+
+	Args:
+		strengths: mean, deviation and fouls of every team's points, see team_strengths
+		schedule: team number at each station of the remaining matches, see remaining_schedule
+		played: results so far, see played_results
+		samples: number of simulated events
+		top: rankings get the probability of finishing in this many places, e.g. the alliance captains
+		seed: random seed
+		chunk: samples drawn at once
+	"""
+	teams = strengths.index.union(played.index).union(pd.Index(schedule.to_numpy().ravel()).unique()).astype(int)
+	strengths = strengths.reindex(teams).fillna(strengths.mean())
+	played = played.reindex(teams).fillna(0)
+	n_teams, n_matches = len(teams), len(schedule)
+
+	# Alliance means, deviations and fouls, red then blue of each match
+	slots = teams.get_indexer(schedule[stations].to_numpy().ravel()).reshape(n_matches, 2, 2)
+	mean = strengths['x̄ Pts'].to_numpy()[slots].sum(axis=2)
+	std = np.sqrt((strengths['σ Pts'].to_numpy()[slots] ** 2).sum(axis=2))
+	fouls = strengths['Fouls'].to_numpy()[slots].sum(axis=2)
+	# Membership of each team in each alliance
+	membership = np.zeros((n_matches * 2, n_teams))
+	np.add.at(membership, (np.repeat(np.arange(n_matches * 2), 2), slots.ravel()), 1)
+	counts = played.Played.to_numpy() + membership.sum(axis=0)
+
+	rng = np.random.default_rng(seed)
+	red_wins = np.zeros(n_matches)
+	ties = np.zeros(n_matches)
+	rp = np.zeros(n_teams)
+	places = np.zeros((n_teams, n_teams))
+	for start in range(0, samples, chunk):
+		size = min(chunk, samples - start)
+		scores = np.rint(mean + std * rng.standard_normal((size, n_matches, 2)))
+		red, blue = scores[:, :, 0], scores[:, :, 1]
+		red_wins += (red > blue).sum(axis=0)
+		ties += (red == blue).sum(axis=0)
+
+		match_rp = np.stack([np.where(red > blue, win_rp, np.where(red == blue, tie_rp, 0)), np.where(blue > red, win_rp, np.where(red == blue, tie_rp, 0))], axis=2)
+		team_rp = played.RP.to_numpy() + match_rp.reshape(size, -1) @ membership
+		team_np = played.npPts.to_numpy() + (scores - fouls).reshape(size, -1) @ membership
+		rp += team_rp.sum(axis=0)
+
+		# Rank by ranking score, then by average non-penalty points
+		with np.errstate(invalid='ignore', divide='ignore'):
+			order = np.lexsort((-np.nan_to_num(team_np / counts), -np.nan_to_num(team_rp / counts)), axis=1)
+		ranks = np.empty_like(order)
+		np.put_along_axis(ranks, order, np.arange(n_teams), axis=1)
+		places += np.bincount((np.arange(n_teams) * n_teams + ranks).ravel(), minlength=n_teams * n_teams).reshape(n_teams, n_teams)
+
+	predictions = schedule[stations].rename_axis(columns=None)
+	predictions['x̄ Red'] = mean[:, 0]
+	predictions['x̄ Blue'] = mean[:, 1]
+	predictions['P(Red)'] = red_wins / samples
+	predictions['P(Blue)'] = 1 - (red_wins + ties) / samples
+	predictions['P(Tie)'] = ties / samples
+
+	rankings = pd.DataFrame({
+		'Played': played.Played.astype(int), 'RP': played.RP.astype(int),
+		'x̄ RP': rp / samples, 'x̄ Rank': places @ np.arange(1, n_teams + 1) / samples,
+		'P(1st)': places[:, 0] / samples, 'P(Top {})'.format(top): places[:, :top].sum(axis=1) / samples
+		}, index=teams)
+	rankings.index.name = 'teamNumber'
+	return predictions, rankings.sort_values('x̄ Rank', kind='stable')
+
+def predict_event(event_code, ftc_api: FtcRequests, samples=100_000, top=4, seed=None):
+	"""
+	Returns win probabilities of an event's remaining qualifiers and its projected final rankings, see simulate.
+
+	Matches played so far are read from storage, so update the event's statistics first for live predictions.
+
+	Args:
+		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+		ftc_api: source of the event's schedule
+		samples: number of simulated events
+		top: rankings get the probability of finishing in this many places
+		seed: random seed
+	"""
+	year = seasons.current.year
+	matches = storage.read('matches', year, events=[event_code])
+	schedule = remaining_schedule(ftc_api.get_event_schedule(event_code, year), matches)
+	played = played_results(matches)
+	teams = played.index.union(pd.Index(schedule.to_numpy().ravel()).unique()).astype(int)
+	return simulate(team_strengths(event_code, teams, year), schedule, played, samples, top, seed)
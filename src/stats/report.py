@@ -2,7 +2,9 @@
 import numpy as np
 import os
 from src.ftc_api.ftc_requests import FtcRequests
+from src.stats import seasons, team_index
 from src.stats.stats import update_statistics
+from src.storage import storage
 
 
 # def calc_auto_oprs(stats):
@@ -13,31 +15,6 @@ from src.stats.stats import update_statistics
 # 	stats['Bucket+'] = stats.Bucket + stats.Foul + stats['End of Round']
 # 	stats['Specimen+'] = stats.Specimen + stats.Foul + stats['End of Round']
 
-# Classify teams
-def select_qualifiers(df):
-	return df[df.eventCode.str[-1:] != 'S']
-
-def select_scrimmages(df):
-	return df[df.eventCode.str[-1:] == 'S']
-
-def classify_teams(df: pd.DataFrame, team_ids: list):
-	"""
-	Classifys teams by the most advanced type of event they've atteneded this year.
-
-	Args:
-		df: a DataFrame with 'teamNumber' and 'eventCode' columns
-		team_ids: list of team_ids to compare
-	"""
-
-	mf = df.reset_index()
-	qual = [id for id in team_ids if id in select_qualifiers(mf).teamNumber.values]
-	scrim = [id for id in team_ids if id in select_scrimmages(mf).teamNumber.values and not id in qual]
-	none = [id for id in team_ids if id not in qual and id not in scrim]
-	classification = {id : 'qualifier' for id in qual}
-	classification.update({id : 'scrimmage' for id in scrim})
-	classification.update({id : 'none' for id in none})
-	return classification
-
 # Stat fxns
 def pool_pts_variance(df, teams):
 	df['un_bessel'] = (df['matchNumber'] - 1) * (df['σ Pts'])**2
@@ -57,16 +34,30 @@ def beautify_matches(df: pd.DataFrame, team_dict):
 	df.insert(loc=4,column='Partner Name',value=df.partnerNumber.map(team_dict))
 	df.rename(columns={'teamNumber': 'Team ID', 'partnerNumber': 'Partner ID', 'matchNumber': 'Match #'},inplace=True)
 	df.rename(columns={'fit0': 'Fit: Bucket', 'fit1': 'Fit: Specimen', 'fit2': 'Fit: Both Buckets', 'fit3' : "Fit: Both Specimens"},inplace=True)
-	df.drop(columns=['eventCode', 'Bucket', 'Auto', 'Endgame', 'Fouls'],inplace=True)
+	df.drop(columns=df.columns.intersection(['eventCode', 'Bucket', 'Auto', 'EndGame', 'Fouls']),inplace=True)
 	return df
 
+def write_csv(df: pd.DataFrame, path):
+	"""Writes a report CSV only if its contents changed, returning whether it was written."""
+	text = df.to_csv(index=False, lineterminator=os.linesep)
+	try:
+		with open(path, encoding='utf-8', newline='') as f:
+			if f.read() == text:
+				return False
+	except FileNotFoundError:
+		pass
+	with open(path + '.tmp', 'w', encoding='utf-8', newline='') as f:
+		f.write(text)
+	os.replace(path + '.tmp', path)
+	return True
+
 
 class Report:
 	"""
 	An event specific scouting report for FTC 2024-2025 Into the Deep.
 
 	Pre:
-		Match data stored locally in data/2024 should be up-to-date.
+		Match data stored locally for 2024 should be up-to-date.
 
 	Args:
 		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
@@ -88,69 +79,75 @@ class Report:
 		return self.report
 
 	def to_csv(self):
+		"""Writes the report CSVs whose contents changed, returning the paths written."""
 		directory = os.path.dirname(f"reports/{self.code}.csv")
 		os.makedirs(directory, exist_ok=True)
-		self.report.to_csv(f"reports/{self.code}.csv", index=False)
+		return [path for path, df in self.outputs().items() if write_csv(df, path)]
+
+	def outputs(self):
+		return {f"reports/{self.code}.csv": self.report}
 
 class Prelook(Report):
 	"""
 	An event specific scouting report that precedes the event
+
+	Each team's row is looked up in the team index, see team_index.build.
+
+	Args:
+		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+		team_dict: dict of the event's team numbers to names
+		index: team index rows holding at least the event's teams, read from storage if None
 	"""
-	def __init__(self, event_code, team_dict):
+	def __init__(self, event_code, team_dict, index=None):
 		super().__init__(event_code)
-		team_ids = team_dict.keys()
-
-		event_df = pd.read_pickle('data/2024/events.pkl')
-		stats = pd.read_pickle('data/2024/disagg_stats.pkl')
-		exp_map = classify_teams(stats, team_ids)
-
-		team_stats = stats.loc[stats.index.get_level_values(0).isin(team_ids)]
-		team_stats.loc[pd.IndexSlice[:,:,0], 'σ Bucket'] = 0
-		team_stats.loc[pd.IndexSlice[:,:,1], 'σ Specimen'] = 0
-		std_dev = pool_pts_variance(team_stats, team_stats.groupby(['teamNumber', 'eventCode']))
-		team_stats = self.prep_for_aggregation(team_stats)
-		team_stats['Last Data'] = team_stats.index.get_level_values(1).map(dict(zip(event_df['code'], event_df['date'])))
-		agg_team_data = { x: 'sum' if x in ['matchNumber','Auto', 'EndGame', 'Fouls', 'x̄ Pts'] else 'max' for x in team_stats.columns }
-		team_stats = team_stats.groupby(['teamNumber', 'eventCode']).agg(agg_team_data)
-		recombine_variance(team_stats, std_dev)
-
-		max_bucket_dev = team_stats[['x̄ Bucket','σ Bucket']].sort_values('x̄ Bucket',ascending=False)['σ Bucket'].groupby('teamNumber').agg('first')
-		max_specimen_dev = team_stats[['x̄ Specimen','σ Specimen']].sort_values('x̄ Specimen',ascending=False)['σ Specimen'].groupby('teamNumber').agg('first')
-
-		agg_potential = { x: 'mean' if x in ['Fouls'] else 'max' for x in team_stats.columns }
-		team_stats = team_stats.groupby('teamNumber').agg(agg_potential)
-		team_stats['σ Bucket'] = max_bucket_dev
-		team_stats['σ Specimen'] = max_specimen_dev
-
-		report = team_stats
-
-		disagg_matches = pd.read_pickle('data/2024/disagg_matches.pkl')
-		disagg_matches = disagg_matches.loc[disagg_matches.teamNumber.isin(team_ids)]
-		max_stats = disagg_matches.groupby(['teamNumber']).agg('max')
-		
-		for team in [x[0] for x in exp_map.items() if x[1] == 'none']:
-			report.loc[team] = [np.NaN] * 14
-
-		report['Experience'] = report.index.get_level_values(0).map(exp_map)
-		report.insert(4,'Team Name',report.index.get_level_values(0).map(team_dict))
+		if index is None:
+			index = team_index.read(seasons.current.year, team_dict.keys())
+
+		# Teams without data get an empty row
+		report = index.reindex(pd.Index(sorted(team_dict), name='teamNumber'))
+		report['Experience'] = report.Experience.fillna('none')
+		report.insert(0, 'Team Name', report.index.map(team_dict))
 		report.reset_index(inplace=True)
 		self.report = report[self.report_filter + ["Last Data","Experience"]].copy()
-		self.report.sort_values(by='teamNumber',inplace=True)
 		self.report.rename(columns={'teamNumber':'Team ID'},inplace=True)
-		self.report.insert(0, 'Max High Samples', max_stats.reset_index().tSMPH)
-		self.report.insert(7, 'Max High Specimens', max_stats.reset_index().tSPCH)
+		self.report.insert(0, 'Max High Samples', report['Max High Samples'])
+		self.report.insert(7, 'Max High Specimens', report['Max High Specimens'])
+
+def prelooks(event_teams):
+	"""
+	Returns the Prelook of each of many upcoming events, from one read of the team index.
+
+	Args:
+		event_teams: dict of event code to its team dict, see Prelook
+	"""
+	teams = set().union(*event_teams.values())
+	index = team_index.read(seasons.current.year, teams)
+	return {code: Prelook(code, team_dict, index) for code, team_dict in event_teams.items()}
 
 
 class Live_Report(Report):
 	"""
 	An event specific scouting report that uses live data during the event
+
+	Args:
+		event_code: alphanumeric event identifier string e.g. 'USPAPHQ1'
+		ftc_api: source of the event's teams and matches
+		team_dict: the event's team names, fetched if None
+		update: update the event's statistics first, otherwise the stored statistics are used
+		tables: dict of 'matches', 'disagg_stats' and 'disagg_matches' to the event's rows of each,
+			read from storage if None, see batch.event_tables
 	"""
-	def __init__(self, event_code, ftc_api: FtcRequests):
+	def __init__(self, event_code, ftc_api: FtcRequests, team_dict=None, update=True, tables=None):
 		super().__init__(event_code)
-		team_dict = ftc_api.get_event_teams(self.code)
-		update_statistics([self.code], ftc_api)
-
-		stats = pd.read_pickle('data/2024/disagg_stats.pkl')
+		if team_dict is None:
+			team_dict = ftc_api.get_event_teams(self.code, seasons.current.year)
+		if update:
+			update_statistics([self.code], ftc_api)
+
+		year = seasons.current.year
+		if tables is None:
+			tables = {table: storage.read(table, year, events=[self.code]) for table in ['matches', 'disagg_stats', 'disagg_matches']}
+		stats = tables['disagg_stats']
 		stats = stats.xs(self.code,level='eventCode')
 
 		stats.loc[pd.IndexSlice[:,0], 'σ Bucket'] = 0
@@ -166,15 +163,13 @@ class Live_Report(Report):
 		self.report = stats[self.report_filter].copy()
 
 		# Get match regression data
-		disagg_matches = pd.read_pickle('data/2024/disagg_matches.pkl')
-		disagg_matches = disagg_matches[disagg_matches.eventCode == self.code]
-		max_stats = disagg_matches.groupby('teamNumber').agg('max')
+		disagg_matches = tables['disagg_matches']
+		max_stats = disagg_matches.groupby('teamNumber')[['tSMPH', 'tSPCH']].agg('max')
 		self.report.insert(0, 'Max High Samples', max_stats.reset_index().tSMPH)
 		self.report.insert(7, 'Max High Specimens', max_stats.reset_index().tSPCH)
 
 		# Get match data
-		matches = pd.read_pickle('data/2024/matches.pkl')
-		matches = matches[matches.eventCode == self.code]
+		matches = tables['matches']
 		matches = pd.merge(matches,disagg_matches[['teamNumber', 'eventCode', 'playoff', 'matchNumber', 'fit0', 'fit1', 'fit2', 'fit3']],on=['teamNumber', 'eventCode', 'playoff', 'matchNumber'],how='inner')
 		self.matches = beautify_matches(matches, team_dict)
 
@@ -184,7 +179,9 @@ class Live_Report(Report):
 		disagg_matches.drop(columns=disagg_matches.columns[-7:],inplace=True)
 		self.disagg_matches = disagg_matches
 
-	def to_csv(self):
-		super().to_csv()
-		self.matches.to_csv(f"reports/{self.code + '_m'}.csv", index=False)
-		self.disagg_matches.to_csv(f"reports/{self.code + '_r'}.csv", index=False)
\ No newline at end of file
+	def outputs(self):
+		return {
+			**super().outputs(),
+			f"reports/{self.code + '_m'}.csv": self.matches,
+			f"reports/{self.code + '_r'}.csv": self.disagg_matches
+			}
\ No newline at end of file
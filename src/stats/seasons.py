@@ -0,0 +1,86 @@
+﻿from src.stats.overrides import OverrideStore
+from src.storage import storage
+
+class Season:
+	"""
+	The scoring model, API column maps and storage of one FTC season.
+
+	Alliance stats are the per alliance counters read from the API score breakdowns, suffixed '_A'
+	in match tables and '_O' once turned into OPR. Disaggregation splits them between two scoring
+	roles, e.g. bucket and specimen robots in Into the Deep.
+
+	Args:
+		year: year of competition kickoff
+		name: name of the game
+		score_map: dict of API score breakdown key to alliance stat
+		location_map: dict of auto location to points
+		ascent_map: dict of endgame ascent to points
+		points: dict of stat to points per scored element, for every stat that scores
+		auto_points: dict of auto stat to points, for the Auto column of disaggregated matches
+		foul_points: dict of foul stat to points it costs
+		roles: dict of scoring role name to the stats that role scores
+		backend: storage of the season's tables, None for the shared backend, see storage.use
+		overrides: folder holding the season's fit override files
+	"""
+	def __init__(self, year, name, score_map, location_map, ascent_map, points, auto_points, foul_points, roles, backend=None, overrides=None):
+		self.year = year
+		self.name = name
+		self.score_map = score_map
+		self.location_map = location_map
+		self.ascent_map = ascent_map
+		self.points = points
+		self.auto_points = auto_points
+		self.foul_points = foul_points
+		self.roles = roles
+		self.backend = backend
+		self.fit_overrides = OverrideStore(overrides or 'overrides/{}'.format(year))
+
+	@property
+	def alliance_stats(self):
+		return list(self.score_map.values())
+
+	@property
+	def match_columns(self):
+		return ['teamNumber', 'station', 'partnerNumber', 'eventCode', 'matchNumber', 'playoff', 'win', 'location', 'ascent'] + self.alliance_stats
+
+	def role_points(self, df, role, prefix='', suffix=''):
+		"""Returns the points a role scored, from stats named prefix + stat + suffix, e.g. 't' and '_O' for teleop OPR."""
+		return sum(self.points[stat] * df[stat + suffix] for stat in self.roles[role] if stat.startswith(prefix))
+
+# Registered seasons by year
+SEASONS = {}
+
+def register(season: Season):
+	SEASONS[season.year] = season
+	return season
+
+into_the_deep = register(Season(
+	2024, 'Into the Deep',
+	score_map={
+		'autoSampleNet': 'aNet_A', 'autoSampleLow': 'aSMPL_A', 'autoSampleHigh': 'aSMPH_A', 'autoSpecimenLow': 'aSPCL_A', 'autoSpecimenHigh': 'aSPCH_A',
+		'teleopSampleNet': 'tNet_A', 'teleopSampleLow': 'tSMPL_A', 'teleopSampleHigh': 'tSMPH_A', 'teleopSpecimenLow': 'tSPCL_A', 'teleopSpecimenHigh': 'tSPCH_A',
+		'minorFouls': 'miFoul_A', 'majorFouls': 'maFoul_A'
+		},
+	location_map={'NONE': 0, 'OBSERVATION_ZONE': 3, 'ASCENT': 3},
+	ascent_map={'NONE': 0, 'OBSERVATION_ZONE': 3, 'ASCENT_1': 5, 'ASCENT_2': 15, 'ASCENT_3': 30},
+	points={'aNet': 2, 'tNet': 2, 'aSMPL': 4, 'tSMPL': 4, 'aSMPH': 8, 'tSMPH': 8, 'aSPCL': 6, 'tSPCL': 6, 'aSPCH': 10, 'tSPCH': 10},
+	auto_points={'aNet': 2, 'aSMPL': 4, 'aSMPH': 8, 'aSPCL': 6, 'aSPCH': 8},
+	foul_points={'miFoul': -5, 'maFoul': -15},
+	roles={'bucket': ['aNet', 'tNet', 'aSMPL', 'tSMPL', 'aSMPH', 'tSMPH'], 'specimen': ['aSPCL', 'tSPCL', 'tSPCH', 'aSPCH']},
+	overrides='overrides'
+	))
+
+# The season every pipeline function works on
+current = into_the_deep
+# Storage of seasons without their own, put back when switching to one of them from a season with its own
+shared_backend = storage.backend
+
+def use(year):
+	"""Switches the pipeline to a registered season, and to its storage if it has its own, otherwise the shared storage."""
+	global current, shared_backend
+	if current.backend is None:
+		# Whatever storage.use last chose while on a season without its own
+		shared_backend = storage.backend
+	current = SEASONS[year]
+	storage.use(current.backend if current.backend is not None else shared_backend)
+	return current
@@ -1,70 +1,257 @@
 ﻿import pandas as pd
 import numpy as np
-import os
 from src.ftc_api.ftc_requests import FtcRequests
-
-location_map = { 'NONE' : 0, 'OBSERVATION_ZONE' : 3, 'ASCENT' : 3 }
-ascent_map = { 'NONE' : 0, 'OBSERVATION_ZONE' : 3, 'ASCENT_1' : 5, 'ASCENT_2' : 15, 'ASCENT_3' : 30 }
-alliance_stats = ['aNet_A', 'aSMPL_A', 'aSMPH_A', 'aSPCL_A', 'aSPCH_A', 'tNet_A', 'tSMPL_A', 'tSMPH_A', 'tSPCL_A', 'tSPCH_A', 'miFoul_A', 'maFoul_A']
-non_alliance_labels = ['teamNumber', 'station', 'partnerNumber', 'eventCode', 'playoff', 'win', 'location', 'ascent']
+from src.instrument import instrument
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice, repeat
+from src.stats import seasons
+from src.stats.team_index import update_team_index
+from src.storage import schema, storage
+
+# Scoring model, column maps and storage year come from the current season, see seasons.use
+fit_codes = {'bucket': 0, 'specimen': 1, '2bucket': 2, '2specimen': 3}
+stations = ['red1', 'red2', 'blue1', 'blue2']
+partners = ['red2', 'red1', 'blue2', 'blue1']
 
 # Statistic helpers
-def initialize_team_matrix(team_ids):
-	team_ids.sort()
-	df = pd.DataFrame(columns=team_ids)
-	return df.reindex(team_ids).fillna(0).sort_index()
-
-def schedule_matrix(df, matrix):
-	for _, r in df.iterrows():
-		matrix.loc[r.teamNumber, r.teamNumber] += 1
-		matrix.loc[r.teamNumber, r.partnerNumber] += 1
+def schedule_matrix(team_index, partner_index, n, weights=None):
+	"""Returns the team x team normal matrix of a schedule: appearances on the diagonal, alliances with each partner off it."""
+	rows = np.concatenate([team_index, team_index])
+	cols = np.concatenate([team_index, partner_index])
+	weights = None if weights is None else np.concatenate([weights, weights])
+	return np.bincount(rows * n + cols, weights=weights, minlength=n * n).reshape(n, n).astype(float)
+
+def solve_opr(matrix, totals):
+	"""
+	Solves matrix @ x = totals for every stat column of totals at once.
 
-def aggregate_alliance_stats(df):
-	agg_d = { c: 'sum' if c in alliance_stats else 'count' for c in df.columns }
-	team_totals = df.groupby(df['teamNumber']).agg(agg_d)
-	return team_totals.drop(labels=non_alliance_labels,axis=1)
+	Uses a Cholesky factorization when the schedule determines every team, and the minimum norm
+	least squares solution when it is rank deficient e.g. teams that only ever played together.
+	"""
+	try:
+		lower = np.linalg.cholesky(matrix)
+		diag = np.diag(lower)
+		if diag.min() > diag.max() * 1e-6:
+			return np.linalg.solve(lower.T, np.linalg.solve(lower, totals))
+	except np.linalg.LinAlgError:
+		pass
+	return np.linalg.lstsq(matrix, totals, rcond=None)[0]
 
 def calculate_event_opr(df, eventCode):
-	team_matrix = initialize_team_matrix(df.teamNumber.unique())
-	schedule_matrix(df, team_matrix)
-	pinv = np.linalg.pinv(team_matrix)
-
-	opr = pd.DataFrame(columns=['eventCode', 'aNet_O', 'aSMPL_O', 'aSMPH_O', 'aSPCL_O', 'aSPCH_O', 'tNet_O', 'tSMPL_O', 'tSMPH_O', 'tSPCL_O', 'tSPCH_O', 'miFoul_O', 'maFoul_O'])
-	opr = opr.reindex(df.teamNumber.unique()).fillna(0)
-	opr.sort_index(inplace=True)
+	alliance_stats = seasons.current.alliance_stats
+	team_ids, index = np.unique(df[['teamNumber', 'partnerNumber']].to_numpy(dtype=np.int64), return_inverse=True)
+	index = index.reshape(-1, 2)
+	team_matrix = schedule_matrix(index[:, 0], index[:, 1], len(team_ids))
 
-	team_totals = aggregate_alliance_stats(df)
+	team_totals = np.zeros((len(team_ids), len(alliance_stats)))
+	np.add.at(team_totals, index[:, 0], df[alliance_stats].to_numpy(dtype=float))
 
-	for stat in alliance_stats:
-		opr[stat[:-1] + "O"] = np.matmul(pinv, team_totals[stat])
-	opr['eventCode'] = [eventCode] * len(opr)
+	opr = pd.DataFrame(solve_opr(team_matrix, team_totals), index=team_ids, columns=[stat[:-1] + "O" for stat in alliance_stats])
+	opr.insert(0, 'eventCode', eventCode)
 	opr.reset_index(inplace=True)
 	return opr
 
+def grouped_moments(df, keys, columns, maxima=()):
+	"""
+	Returns the row count, sums, sums of squares and maxima of each group, from one grouped pass over a table.
+
+	Means and standard deviations follow from these, see moments_std.
+
+	Args:
+		df: a table holding the key and value columns
+		keys: columns to group by
+		columns: columns to sum and sum the squares of
+		maxima: columns to also take the maximum of
+	"""
+	values = df[columns].astype('float64')
+	stacked = pd.concat({'sum': values, 'square': values ** 2, 'max': df[list(maxima)]}, axis=1)
+	groups = stacked.groupby([df[key] for key in keys], observed=True)
+	moments = groups.agg({c: 'max' if c[0] == 'max' else 'sum' for c in stacked.columns})
+	return groups.size(), moments['sum'], moments['square'], moments['max'] if maxima else None
+
+def moments_std(count, sums, squares):
+	"""Returns the sample standard deviation of each group from its moments, NaN for single row groups."""
+	variance = (squares - sums ** 2 / count.to_numpy()[:, None]) / (count.to_numpy()[:, None] - 1)
+	return np.sqrt(variance.clip(lower=0))
+
 def aggregate_event_matches(df):
-	agg_event = { x: 'sum' if x in ['location' , 'ascent', 'win'] else 'first' if x == 'stdDev' else 'count' for x in df.columns }
-	return df.groupby(['eventCode', 'teamNumber','playoff']).agg(agg_event).drop(columns=['teamNumber', 'station', 'partnerNumber', 'eventCode', 'playoff', 'npPts'] + alliance_stats)
+	"""Returns each team's match count, win, location and ascent totals and npPts standard deviation per event."""
+	count, sums, squares, _ = grouped_moments(df, ['eventCode', 'teamNumber', 'playoff'], ['win', 'location', 'ascent', 'npPts'])
+	agg = sums[['win', 'location', 'ascent']].astype(int)
+	agg.insert(0, 'matchNumber', count)
+	agg['stdDev'] = moments_std(count, sums[['npPts']], squares[['npPts']]).npPts
+	return agg
 
 # Pre: a match data dataframe, with playoff data removed
 def calculate_opr(df):
 	oprs = []
-	dfs = [g for _, g in df.groupby('eventCode')]
+	dfs = [g for _, g in df.groupby('eventCode', observed=True)]
 	for f in dfs:
 		oprs.append(calculate_event_opr(f, f.eventCode.values[0]))
 	return oprs
+
+def recency_weights(df, event_dates, half_life=28, epoch=None):
+	"""
+	Returns a weight per match row that doubles every half_life days of event date.
+
+	OPR is unchanged by scaling every weight, so weights are relative to an epoch and never need
+	recomputing as new events arrive, as long as the same epoch is used, see update_season_opr.
+
+	Args:
+		df: a match data dataframe
+		event_dates: dict of event code to ISO date string, e.g. from the events table
+		half_life: days over which a match loses half its weight against newer matches
+		epoch: Timestamp weights are relative to, the earliest of event_dates if None
+	"""
+	dates = pd.to_datetime(df.eventCode.astype(object).map(event_dates))
+	if epoch is None:
+		epoch = pd.to_datetime(pd.Series(list(event_dates.values()))).min()
+	return np.exp2(((dates - epoch).dt.days.fillna(0) / half_life).to_numpy())
+
+class SeasonOpr:
+	"""
+	OPR over every tracked event at once, as one weighted least squares system.
+
+	New matches are folded in with add_matches, which warm starts a conjugate gradient solve
+	from the previous solution instead of re-solving from scratch. Each row's event and weighted
+	stats are kept, so an event's rows can be taken back out with remove_events e.g. when a match
+	is rescored.
+
+	Args:
+		matches: a match data dataframe, with playoff data removed
+		weights: optional weight per match row e.g. from recency_weights
+	"""
+	def __init__(self, matches, weights=None):
+		self.stats = seasons.current.alliance_stats
+		self.team_ids = np.zeros(0, dtype=np.int64)
+		self.teams = np.zeros(0, dtype=np.int64)
+		self.partners = np.zeros(0, dtype=np.int64)
+		self.weights = np.zeros(0)
+		self.codes = np.zeros(0, dtype=object)
+		self.values = np.zeros((0, len(self.stats)))
+		self.totals = np.zeros((0, len(self.stats)))
+		self.append(matches, weights)
+		n = len(self.team_ids)
+		self.solution = solve_opr(schedule_matrix(self.teams, self.partners, n, self.weights), self.totals)
+
+	def append(self, matches, weights=None):
+		"""Adds match rows to the system, giving new teams an index and an empty solution."""
+		weights = np.ones(len(matches)) if weights is None else np.asarray(weights, dtype=float)
+		ids = matches[['teamNumber', 'partnerNumber']].to_numpy(dtype=np.int64)
+		new_ids = np.setdiff1d(ids, self.team_ids)
+		self.team_ids = np.concatenate([self.team_ids, new_ids])
+		order = np.argsort(self.team_ids)
+		index = order[np.searchsorted(self.team_ids, ids, sorter=order)]
+		self.teams = np.concatenate([self.teams, index[:, 0]])
+		self.partners = np.concatenate([self.partners, index[:, 1]])
+		self.weights = np.concatenate([self.weights, weights])
+		self.codes = np.concatenate([self.codes, matches.eventCode.to_numpy(dtype=object)])
+		values = weights[:, None] * matches[self.stats].to_numpy(dtype=float)
+		self.values = np.concatenate([self.values, values])
+		self.totals = np.concatenate([self.totals, np.zeros((len(new_ids), len(self.stats)))])
+		np.add.at(self.totals, index[:, 0], values)
+		if hasattr(self, 'solution'):
+			self.solution = np.concatenate([self.solution, np.zeros((len(new_ids), len(self.stats)))])
+
+	def remove_events(self, event_codes):
+		"""Takes every match row of some events out of the system, teams keeping their index and solution."""
+		removed = np.isin(self.codes, list(event_codes))
+		np.subtract.at(self.totals, self.teams[removed], self.values[removed])
+		kept = ~removed
+		self.teams, self.partners, self.weights = self.teams[kept], self.partners[kept], self.weights[kept]
+		self.codes, self.values = self.codes[kept], self.values[kept]
+
+	def multiply(self, x):
+		"""Returns the normal matrix times x, straight from the match rows without forming the matrix."""
+		out = np.zeros_like(x)
+		np.add.at(out, self.teams, self.weights[:, None] * (x[self.teams] + x[self.partners]))
+		return out
+
+	def refine(self, tol=1e-8, maxiter=None):
+		"""Runs conjugate gradient on every stat column at once, starting from the current solution."""
+		x = self.solution
+		r = self.totals - self.multiply(x)
+		p = r.copy()
+		rs = (r * r).sum(axis=0)
+		limit = (tol * np.linalg.norm(self.totals, axis=0)) ** 2
+		for _ in range(maxiter or len(self.team_ids)):
+			if (rs <= limit).all():
+				break
+			q = self.multiply(p)
+			pq = (p * q).sum(axis=0)
+			alpha = np.divide(rs, pq, out=np.zeros_like(rs), where=pq > 0)
+			x = x + alpha * p
+			r = r - alpha * q
+			rs_next = (r * r).sum(axis=0)
+			p = r + np.divide(rs_next, rs, out=np.zeros_like(rs), where=rs > 0) * p
+			rs = rs_next
+		self.solution = x
+
+	def add_matches(self, matches, weights=None):
+		"""Folds newly scored match rows into the solution."""
+		self.append(matches, weights)
+		self.refine()
+
+	def to_frame(self):
+		"""Returns the solution of every team with match rows as an OPR table sorted by team."""
+		active = np.bincount(self.teams, minlength=len(self.team_ids)) > 0
+		opr = pd.DataFrame(self.solution[active], index=self.team_ids[active], columns=[stat[:-1] + "O" for stat in self.stats])
+		return opr.sort_index().rename_axis('teamNumber').reset_index()
 		
 	
 # Scouting report helpers
+def enum_points(col, point_map):
+	"""Returns the points of an enum column e.g. location, whether it holds strings or categories."""
+	return col.astype(object).map(point_map)
+
 def calc_npPts(df):
 	"""# of points scored by your alliance, minus opposing fouls and ally ascent points."""
-	df = df.replace({'location':location_map, 'ascent':ascent_map})
-	df['npPts'] = 2 * (df.aNet_A + df.tNet_A) + 4 * (df.aSMPL_A + df.tSMPL_A) + 8 * (df.aSMPH_A + df.tSMPH_A) + 6 * (df.aSPCL_A + df.tSPCL_A) + 10 * (df.aSPCH_A + df.tSPCH_A) + df.location + df.ascent
+	season = seasons.current
+	df = df.assign(location=enum_points(df.location, season.location_map), ascent=enum_points(df.ascent, season.ascent_map))
+	df['npPts'] = sum(points * df[stat + '_A'] for stat, points in season.points.items()) + df.location + df.ascent
 	return df
 
-def std_by_event(df):
-	std_values = df.groupby(["eventCode", "teamNumber", "playoff"])["npPts"].std()
-	for i, r in df.iterrows():
-		df.loc[i, 'stdDev'] = std_values.loc[r.eventCode, r.teamNumber, r.playoff]
+def flatten_teams(mf):
+	"""Returns the team number at each station, indexed by (matchNumber, tournamentLevel)."""
+	tf = mf[['matchNumber', 'series', 'tournamentLevel', 'teams']].copy()
+	tf.loc[tf.series > 0, 'matchNumber'] = tf.series
+	tf = tf.explode('teams', ignore_index=True).dropna(subset=['teams'])
+	tf = tf.join(pd.json_normalize(tf.pop('teams').tolist()).set_index(tf.index)[['station', 'teamNumber']])
+	tf['station'] = tf.station.str.lower()
+	tf = tf.drop_duplicates(['matchNumber', 'tournamentLevel', 'station'])
+	return tf.pivot(index=['matchNumber', 'tournamentLevel'], columns='station', values='teamNumber')
+
+def flatten_stage(f, teams, is_playoff, eventCode):
+	"""
+	Returns one row per robot for a stage frame, either playoffs or qualifiers.
+
+	f: a stage frame with one row per scored match and its 'alliances' JSON
+	teams: station lookup from flatten_teams
+	"""
+	score_map = seasons.current.score_map
+	f = f.reset_index(drop=True)
+	level = "PLAYOFF" if is_playoff else "QUALIFICATION"
+	keys = pd.DataFrame({'matchNumber': f.matchSeries if is_playoff else f.matchNumber, 'tournamentLevel': level})
+	keys = keys.join(teams, on=['matchNumber', 'tournamentLevel'])
+
+	af = f[['alliances']].assign(order=f.index).explode('alliances', ignore_index=True)
+	af = af.join(pd.json_normalize(af.pop('alliances').tolist()))
+	af = af.drop_duplicates(['order', 'alliance'])
+	red = af[af.alliance == 'Red'].set_index('order')
+	blue = af[af.alliance == 'Blue'].set_index('order')
+	margin = red.totalPoints - blue.totalPoints
+
+	frames = []
+	for station, partner, side, sign in zip(stations, partners, [red, red, blue, blue], [1, 1, -1, -1]):
+		robot = "robot" + station[-1:]
+		sf = pd.DataFrame({
+			'teamNumber': keys[station], 'station': station, 'partnerNumber': keys[partner], 'eventCode': eventCode,
+			'matchNumber': keys.matchNumber, 'playoff': is_playoff, 'win': sign * margin > 0,
+			'location': side[robot + 'Auto'], 'ascent': side[robot + 'Teleop']
+			})
+		frames.append(sf.join(side[list(score_map)].rename(columns=score_map)))
+	return pd.concat(frames).sort_index(kind='stable')
 
 def process_event(mf, qf, pf, eventCode):
 	"""
@@ -74,231 +261,435 @@ def process_event(mf, qf, pf, eventCode):
 	qf: Qualifiers Frame: detailed alliance scoring for qualifier matches
 	pf: Playoffs Frame: detailed alliance scoring for playoff matches
 	"""
+	teams = flatten_teams(mf)
+	stages = [flatten_stage(f, teams, is_playoff, eventCode) for is_playoff, f in [(False, qf), (True, pf)] if not f.empty]
+	df = pd.concat(stages, ignore_index=True) if stages else pd.DataFrame()
+	return schema.apply('matches', df.reindex(columns=seasons.current.match_columns))
 
-	# Pre-Process matches
-	mf['red1'] = [0] * len(mf)
-	mf['red2'] = [0] * len(mf)
-	mf['blue1'] = [0] * len(mf)
-	mf['blue2'] = [0] * len(mf)
-	mf.loc[mf.series > 0, 'matchNumber'] = mf.series
-
-	# Flatten team ID data
-	for i, row in mf.iterrows():
-		tf = pd.DataFrame(row.teams)
-		mf.at[i, 'red1'] = tf[tf.station == 'Red1'].teamNumber
-		mf.at[i, 'red2'] = tf[tf.station == 'Red2'].teamNumber
-		mf.at[i, 'blue1'] = tf[tf.station == 'Blue1'].teamNumber
-		mf.at[i, 'blue2'] = tf[tf.station == 'Blue2'].teamNumber
-
-	df = pd.DataFrame(columns=['teamNumber', 'station', 'partnerNumber', 'eventCode', 'matchNumber', 'playoff', 'win', 'location', 'ascent', 'aNet_A', 'aSMPL_A', 'aSMPH_A', 'aSPCL_A', 'aSPCH_A', 'tNet_A', 'tSMPL_A', 'tSMPH_A', 'tSPCL_A', 'tSPCH_A', 'miFoul_A', 'maFoul_A'])
-
-	# f: a stage frame, either playoffs or qualifiers
-	def process_stage(is_playoff, f):
-		for i, row in f.iterrows():
-			sf = pd.DataFrame(row.alliances)
-
-			offset = i * 4 + len(df)
-			level = "PLAYOFF" if is_playoff else "QUALIFICATION"
-			alliance_win = sf.loc[sf.alliance == 'Red', 'totalPoints'].values[0] - sf.loc[sf.alliance == 'Blue', 'totalPoints'].values[0]
-
-			for index, station, partner, win in zip([0,1,2,3], ['red1', 'red2', 'blue1', 'blue2'], ['red2', 'red1', 'blue2', 'blue1'], [alliance_win > 0, alliance_win > 0, alliance_win < 0, alliance_win < 0]):
-				alliance = station[0].upper() + station[1:-1]
-				robot = "robot" + station[-1:]
-				df.at[offset + index, 'teamNumber'] = mf.loc[(mf.matchNumber == row.matchNumber) & (mf.tournamentLevel == level), station].values[0]
-				df.at[offset + index, 'station'] = station
-				df.at[offset + index, 'partnerNumber'] = mf.loc[(mf.matchNumber == row.matchNumber) & (mf.tournamentLevel == level), partner].values[0]
-				df.at[offset + index, 'eventCode'] = eventCode
-				df.at[offset + index, 'matchNumber'] = row.matchNumber
-				df.at[offset + index, 'playoff'] = is_playoff
-				df.at[offset + index, 'win'] = win
-				df.at[offset + index, 'location'] = sf.loc[sf.alliance == alliance, robot + 'Auto'].values[0]
-				df.at[offset + index, 'ascent'] = sf.loc[sf.alliance == alliance, robot + 'Teleop'].values[0]
-				df.at[offset + index, 'aNet_A'] = sf.loc[sf.alliance == alliance, 'autoSampleNet'].values[0]
-				df.at[offset + index, 'aSMPL_A'] = sf.loc[sf.alliance == alliance, 'autoSampleLow'].values[0]
-				df.at[offset + index, 'aSMPH_A'] = sf.loc[sf.alliance == alliance, 'autoSampleHigh'].values[0]
-				df.at[offset + index, 'aSPCL_A'] = sf.loc[sf.alliance == alliance, 'autoSpecimenLow'].values[0]
-				df.at[offset + index, 'aSPCH_A'] = sf.loc[sf.alliance == alliance, 'autoSpecimenHigh'].values[0]
-				df.at[offset + index, 'tNet_A'] = sf.loc[sf.alliance == alliance, 'teleopSampleNet'].values[0]
-				df.at[offset + index, 'tSMPL_A'] = sf.loc[sf.alliance == alliance, 'teleopSampleLow'].values[0]
-				df.at[offset + index, 'tSMPH_A'] = sf.loc[sf.alliance == alliance, 'teleopSampleHigh'].values[0]
-				df.at[offset + index, 'tSPCL_A'] = sf.loc[sf.alliance == alliance, 'teleopSpecimenLow'].values[0]
-				df.at[offset + index, 'tSPCH_A'] = sf.loc[sf.alliance == alliance, 'teleopSpecimenHigh'].values[0]
-				df.at[offset + index, 'miFoul_A'] = sf.loc[sf.alliance == alliance, 'minorFouls'].values[0]
-				df.at[offset + index, 'maFoul_A'] = sf.loc[sf.alliance == alliance, 'majorFouls'].values[0]
-
-	process_stage(False, qf)
-	if not pf.empty:
-		pf.matchNumber = pf.matchSeries
-		process_stage(True, pf)
-
-	return df
+@instrument.stage
+def update_matches(event_list, ftc_api: FtcRequests, event_data=None, pool=None):
+	"""
+	Returns the tracked matches of every event whose matches changed, and the set of their codes.
 
-def update_matches(event_list, ftc_api: FtcRequests) -> pd.DataFrame:
-	event_data = ftc_api.get_events_data(event_list)
-	match_data = [pd.read_pickle('data/2024/matches.pkl')]
-	for code, event in zip(event_list, event_data):
-		match_data.append(process_event(event['mf'], event['qf'], event['pf'], code))
-	mf = pd.concat(match_data).reset_index(drop=True).drop_duplicates()
-	mf.to_pickle('data/2024/matches.pkl')
-	return mf
+	A rescored match replaces its stored rows.
 
-def update_opr(matches):
+	Args:
+		event_list: list of alphanumeric event identifier strings
+		ftc_api: fetches the event data when event_data is None
+		event_data: event data already fetched for event_list, see FtcRequests.get_events_data
+		pool: process pool to process events in, one event per task
+	"""
+	year = seasons.current.year
+	if event_data is None:
+		event_data = ftc_api.get_events_data(event_list, year)
+	if pool is None:
+		processed = [process_event(event['mf'], event['qf'], event['pf'], code) for code, event in zip(event_list, event_data)]
+	else:
+		processed = pool.map(process_shard, repeat(year), event_list, event_data, chunksize=4)
+	matches = storage.read('matches', year, events=event_list)
+	match_data = []
+	for code, fresh in zip(event_list, processed):
+		stored = matches[matches.eventCode == code] if not matches.empty else matches
+		if fresh.empty:
+			continue
+		if stored.empty:
+			# First ingest of the event, nothing stored to reconcile with
+			match_data.append(fresh.drop_duplicates(['playoff', 'matchNumber', 'station']))
+			continue
+		mf = pd.concat([stored, fresh]).drop_duplicates()
+		if len(mf) > len(stored):
+			# Fresh rows first, in the order a full rebuild has them, then stored matches no longer listed
+			match_data.append(pd.concat([fresh, stored]).drop_duplicates(['playoff', 'matchNumber', 'station']))
+	dirty = {f.eventCode.values[0] for f in match_data}
+	if dirty:
+		matches = schema.apply('matches', pd.concat(match_data).reset_index(drop=True))
+		storage.write('matches', matches, year, events=dirty)
+	return matches, dirty
+
+@instrument.stage
+def update_opr(matches, dirty=None):
 	oprs = calculate_opr(matches)
 	df = pd.concat(oprs).reset_index(drop=True)
 	df = df.rename({'index':'teamNumber'},axis=1)
-	df.to_pickle('data/2024/stats.pkl')
+	storage.write('stats', df, seasons.current.year, events=dirty)
 	return df
 
-def update_aggregations(matches):
+@instrument.stage
+def update_season_opr(matches, half_life=None):
+	"""
+	Updates season-wide OPR, replacing the match rows of only the events that changed since the last update.
+
+	A changed event's old rows are taken out and all its current rows folded in, so rescored
+	matches, which replace their rows in place, and removed matches are accounted for too.
+
+	Args:
+		matches: the tracked matches of every changed event, as returned by update_matches
+		half_life: days for recency weighting, or None to weight every match equally
+	"""
+	year = seasons.current.year
+	event_df = storage.read('events', year)
+	event_dates = dict(zip(event_df['code'], event_df['date']))
+	def weigh(df, epoch):
+		return None if half_life is None else recency_weights(df, event_dates, half_life, epoch)
+
+	season = storage.read_blob('season_opr', year)
+	# Blobs saved without a fixed epoch, or before rows kept their event, are rebuilt too
+	stale = season is None or not hasattr(season, 'epoch') or season.stats != seasons.current.alliance_stats or season.half_life != half_life
+	if stale:
+		matches = storage.read('matches', year)
+		reg_matches = matches[~matches.playoff.astype(bool)]
+		# Weights are relative to the season's start, not the earliest stored event, which moves
+		# whenever get_region_events replaces the events table, and the epoch is kept with the system
+		epoch = pd.Timestamp(year, 9, 1)
+		season = SeasonOpr(reg_matches, weigh(reg_matches, epoch))
+		season.epoch = epoch
+	else:
+		reg_matches = matches[~matches.playoff.astype(bool)]
+		season.remove_events(matches.eventCode.astype(object).unique())
+		season.add_matches(reg_matches, weigh(reg_matches, season.epoch))
+	season.half_life = half_life
+	storage.write_blob('season_opr', season, year)
+	df = season.to_frame()
+	storage.write('season_stats', df, year)
+	return df
+
+def aggregate_matches(matches):
 	matches = calc_npPts(matches)
-	std_by_event(matches)
 	matches.win = matches.win.astype(int)
-	agg = aggregate_event_matches(matches)
-	agg.to_pickle('data/2024/agg_stats.pkl')
+	return aggregate_event_matches(matches)
+
+@instrument.stage
+def update_aggregations(matches, dirty=None):
+	agg = aggregate_matches(matches)
+	storage.write('agg_stats', agg, seasons.current.year, events=dirty)
+	return agg
 
 def fillna_as_ints(df):
 	for col in df.select_dtypes(include=['number']).columns:
 		df[col] = pd.to_numeric(df[col]).fillna(0).astype(int)
 	return df
 
-def find_fit(fits: list, row):
-	if os.path.exists('overrides/' + row.eventCode + '.csv'):
-		overrides = pd.read_csv('overrides/' + row.eventCode + '.csv')
-		overrides.set_index(['team_id', 'match_number', 'playoff'], inplace=True)
-		if ((row.teamNumber, row.matchNumber, row.playoff) in overrides.index):
-			fit = overrides.loc[row.teamNumber, row.matchNumber, row.playoff].fit
-			if fit == 'bucket':
-				return 0
-			elif fit == 'specimen':
-				return 1
-			elif fit == '2bucket':
-				return 2
-			elif fit == '2specimen':
-				return 3
-			else:
-				print(f"Unkown fit: {fit}")
-	return fits.index(min(fits))
-
-def split_stats(stat_list, bot1, bot2, bot1_dict, bot2_dict):
+def find_fit(fits, bots):
+	"""
+	Returns the index of the best fit of each alliance, unless its first robot's match is overridden.
+
+	fits: an alliances x 4 array of fit errors
+	bots: the first robot of each alliance
+	"""
+	fit = fits.argmin(axis=1)
+	overrides = seasons.current.fit_overrides.index(bots.eventCode.unique())
+	if not overrides:
+		return fit
+	chosen = [overrides.get(key) for key in zip(bots.eventCode, bots.teamNumber, bots.matchNumber, bots.playoff)]
+	for i, override in enumerate(chosen):
+		if override in fit_codes:
+			fit[i] = fit_codes[override]
+		elif override is not None:
+			print(f"Unkown fit: {override}")
+	return fit
+
+def split_stats(stat_list, bot1, bot2, bot1_dict, bot2_dict, mask):
+	"""Splits each alliance stat between the robots in proportion to their OPR, for alliances in mask."""
 	for stat in stat_list:
-		actual = bot1[stat + "_A"]
-		expected1 = max(0, bot1[stat + "_O"])
-		expected2 = max(0, bot2[stat + "_O"])
+		actual = bot1[stat + "_A"].to_numpy(dtype=float)
+		expected1 = np.maximum(0, bot1[stat + "_O"].to_numpy(dtype=float))
+		expected2 = np.maximum(0, bot2[stat + "_O"].to_numpy(dtype=float))
 		combined_pr = expected1 + expected2
-		if combined_pr != 0 and actual > 0:
-			bot1_dict[stat] = round(expected1 * actual / combined_pr)
-			bot2_dict[stat] = round(expected2 * actual / combined_pr)
+		split = mask & (combined_pr != 0) & (actual > 0)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			bot1_dict[stat] = np.where(split, np.round(expected1 * actual / combined_pr), bot1_dict[stat])
+			bot2_dict[stat] = np.where(split, np.round(expected2 * actual / combined_pr), bot2_dict[stat])
 
 def calculate_potentials(bot, type):
 	SPEC_FACTOR = 0.8
-	tBucket = 2 * (bot[type + "Net_O"]) + 4 * (bot[type + "SMPL_O"]) + 8 * (bot[type + "SMPH_O"])
-	tSpecimen = 6 * (bot[type + "SPCL_O"]) + 10 * (bot[type + "SPCH_O"])
+	tBucket = seasons.current.role_points(bot, 'bucket', type, '_O')
+	tSpecimen = seasons.current.role_points(bot, 'specimen', type, '_O')
 	return (tBucket + SPEC_FACTOR * tSpecimen, tSpecimen + SPEC_FACTOR * tBucket)
 
 def calculate_actuals(row, type):
-	tBucket = 2 * (row[type + "Net_A"]) + 4 * (row[type + "SMPL_A"]) + 8 * (row[type + "SMPH_A"])
-	tSpecimen = 6 * (row[type + "SPCL_A"]) + 10 * (row[type + "SPCH_A"])
+	tBucket = seasons.current.role_points(row, 'bucket', type, '_A')
+	tSpecimen = seasons.current.role_points(row, 'specimen', type, '_A')
 	return (tBucket, tSpecimen)
 
 def get_disaggregate(bot1, bot2):
-	row = bot1
+	"""
+	Returns the disaggregated stats of the first and second robot of every alliance at once.
+
+	bot1, bot2: frames of the first and second robot of each alliance, row aligned, with alliance (_A) and OPR (_O) stats
+	"""
+	bucket_stats, specimen_stats = seasons.current.roles['bucket'], seasons.current.roles['specimen']
+	foul_stats = list(seasons.current.foul_points)
+	bot1 = bot1.reset_index(drop=True)
+	bot2 = bot2.reset_index(drop=True)
+	numeric = [stat + suffix for stat in bucket_stats + specimen_stats + foul_stats for suffix in ['_A', '_O']]
+	row = bot1[numeric].astype(float)
 	# Calculate Actuals
 	tBucket, tSpecimen = calculate_actuals(row, 't')
 	aBucket, aSpecimen = calculate_actuals(row, 'a')
 
 	#Calculate Potentials
-	tPotential1B, tPotential1S = calculate_potentials(bot1, 't')
-	tPotential2B, tPotential2S = calculate_potentials(bot2, 't')
-	aPotential1B, aPotential1S = calculate_potentials(bot1, 'a')
-	aPotential2B, aPotential2S = calculate_potentials(bot2, 'a')
+	tPotential1B, tPotential1S = calculate_potentials(row, 't')
+	tPotential2B, tPotential2S = calculate_potentials(bot2[numeric].astype(float), 't')
+	aPotential1B, aPotential1S = calculate_potentials(row, 'a')
+	aPotential2B, aPotential2S = calculate_potentials(bot2[numeric].astype(float), 'a')
 
 	# Calulate fits
 	fit0 = abs(tBucket - tPotential1B) + abs(tSpecimen - tPotential2S) + abs(aBucket - aPotential1B) + abs(aSpecimen - aPotential2S)
 	fit1 = abs(tBucket - tPotential2B) + abs(tSpecimen - tPotential1S) + abs(aBucket - aPotential2B) + abs(aSpecimen - aPotential1S)
 	fit2 = abs(tBucket - tPotential1B - tPotential2B) + abs(aBucket - aPotential1B - aPotential2B) + tSpecimen * 1.5
 	fit3 = abs(tSpecimen - tPotential1S - tPotential2S) + abs(aSpecimen - aPotential1S - aPotential2S) + tBucket * 2.5
-	
-	fit = find_fit([fit0,fit1,fit2,fit3], row)
+
+	fit = find_fit(np.column_stack([fit0, fit1, fit2, fit3]), bot1)
 	bot1_dict = {'teamNumber': bot1.teamNumber, 'eventCode': bot1.eventCode, 'playoff': bot1.playoff, 'matchNumber': bot1.matchNumber, 'fit0': fit0,'fit1': fit1,'fit2': fit2,'fit3': fit3,}
 	bot2_dict = {'teamNumber': bot2.teamNumber, 'eventCode': bot2.eventCode, 'playoff': bot2.playoff, 'matchNumber': bot2.matchNumber, 'fit0': fit1,'fit1': fit0,'fit2': fit2,'fit3': fit3,}
-	if fit == 0:
-		bot1_dict['isBucket'] = 1
-		for stat in ['aNet', 'tNet' , 'aSMPL' , 'tSMPL' , 'aSMPH', 'tSMPH']:
-			bot1_dict[stat] = row[stat + '_A']
-		bot2_dict['isSpecimen'] = 1
-		for stat in ['aSPCL', 'tSPCL' ,'aSPCH', 'tSPCH']:
-			bot2_dict[stat] = row[stat + '_A']
-	elif fit == 1:
-		bot2_dict['isBucket'] = 1
-		for stat in ['aNet', 'tNet' , 'aSMPL' , 'tSMPL' , 'aSMPH', 'tSMPH']:
-			bot2_dict[stat] = row[stat + '_A']
-		bot1_dict['isSpecimen'] = 1
-		for stat in ['aSPCL', 'tSPCL' ,'aSPCH', 'tSPCH']:
-			bot1_dict[stat] = row[stat + '_A']
-	else:
-		if fit == 2:
-			bot1_dict['isBucket'] = 1
-			bot2_dict['isBucket'] = 1
-		else:
-			bot1_dict['isSpecimen'] = 1
-			bot2_dict['isSpecimen'] = 1
-		# Split each stat
-		split_stats(['aNet', 'tNet' , 'aSMPL' , 'tSMPL' , 'aSMPH', 'tSMPH','aSPCL', 'tSPCL' ,'aSPCH', 'tSPCH'], bot1, bot2, bot1_dict, bot2_dict)
+	bot1_dict['isBucket'] = np.isin(fit, [0, 2]).astype(int)
+	bot2_dict['isBucket'] = np.isin(fit, [1, 2]).astype(int)
+	bot1_dict['isSpecimen'] = np.isin(fit, [1, 3]).astype(int)
+	bot2_dict['isSpecimen'] = np.isin(fit, [0, 3]).astype(int)
+	# The bucket robot keeps every bucket stat and the specimen robot every specimen stat
+	for stat in bucket_stats:
+		bot1_dict[stat] = np.where(fit == 0, row[stat + '_A'], np.nan)
+		bot2_dict[stat] = np.where(fit == 1, row[stat + '_A'], np.nan)
+	for stat in specimen_stats:
+		bot1_dict[stat] = np.where(fit == 1, row[stat + '_A'], np.nan)
+		bot2_dict[stat] = np.where(fit == 0, row[stat + '_A'], np.nan)
+	for stat in foul_stats:
+		bot1_dict[stat] = bot2_dict[stat] = np.full(len(fit), np.nan)
+	# Split each stat
+	split_stats(bucket_stats + specimen_stats, bot1, bot2, bot1_dict, bot2_dict, fit >= 2)
 	# Always split fouls
-	split_stats(['miFoul', 'maFoul'], bot1, bot2, bot1_dict, bot2_dict)
-	return (bot1_dict, bot2_dict)
+	split_stats(foul_stats, bot1, bot2, bot1_dict, bot2_dict, np.full(len(fit), True))
+	return (pd.DataFrame(bot1_dict), pd.DataFrame(bot2_dict))
 
 def disaggregate_groups(groups):
-	g = []
-	for _, group in groups:
-		f = get_disaggregate(group.iloc[0], group.iloc[1])
-		g.append(f[0])
-		g.append(f[1])
-	return g
-
-def update_disaggregate_matches(matches, stats):
+	"""Returns disaggregated stats for groups of alliance partners, in group order with the first robot first."""
+	position = groups.cumcount()
+	alliance = groups.ngroup()
+	bot1 = groups.obj[position == 0].set_index(alliance[position == 0])
+	bot2 = groups.obj[position == 1].set_index(alliance[position == 1])
+	bot1 = bot1.loc[bot1.index.isin(bot2.index)].sort_index()
+	bot2 = bot2.loc[bot1.index]
+	f = get_disaggregate(bot1, bot2)
+	g = pd.concat(f).sort_index(kind='stable').reset_index(drop=True)
+	return g.infer_objects()
+
+@instrument.stage
+def disaggregate_matches(matches, stats):
+	"""Returns every robot's share of its alliance's stats, see get_disaggregate."""
 	df = matches
 	df = pd.merge(df, stats, on=['eventCode', 'teamNumber'], how="inner")
-	groups = df.groupby(['eventCode',df['station'].str[:-1],'playoff','matchNumber'])
-	disag_df = pd.DataFrame(disaggregate_groups(groups))
+	groups = df.groupby(['eventCode',df['station'].str[:-1],'playoff','matchNumber'], observed=True)
+	disag_df = disaggregate_groups(groups)
 	disag_df = fillna_as_ints(disag_df)
 	df = pd.merge(df, disag_df, on=['teamNumber', 'eventCode','playoff','matchNumber'], how='inner')
-	df['Fouls'] = df.miFoul * -5 + df.maFoul *-15
-	df['Bucket'] = 2 * (df.aNet + df.tNet) + 4 * (df.aSMPL + df.tSMPL) + 8 * (df.aSMPH + df.tSMPH)
-	df['Specimen'] = 6 * (df.aSPCL + df.tSPCL) + 10 * (df.aSPCH + df.tSPCH)
-	df['Auto'] = 2 * df.aNet + 4 * df.aSMPL + 8 * df.aSMPH + 6 * df.aSPCL + 8 * df.aSPCH + df.location.map(location_map)
-	df['EndGame'] = df.ascent.map(ascent_map)
-	df['Pts'] = df.Bucket + df.Specimen + df.location.map(location_map) + df.EndGame + df.Fouls
-	disagg_matches = df[['teamNumber', 'station', 'partnerNumber', 'eventCode', 'matchNumber','playoff', 'win', 'location', 'ascent', 'aNet', 'tNet', 'aSMPL', 'tSMPL', 'aSMPH', 'tSMPH','aSPCL', 'tSPCL', 'tSPCH','aSPCH','miFoul', 'maFoul','Auto','EndGame', 'Fouls', 'Bucket', 'Specimen', 'isBucket', 'isSpecimen', 'Pts', 'fit0', 'fit1', 'fit2', 'fit3']]
-	disagg_matches.to_pickle('data/2024/disagg_matches.pkl')
+	season = seasons.current
+	df['Fouls'] = sum(points * df[stat] for stat, points in season.foul_points.items())
+	df['Bucket'] = season.role_points(df, 'bucket')
+	df['Specimen'] = season.role_points(df, 'specimen')
+	df['Auto'] = sum(points * df[stat] for stat, points in season.auto_points.items()) + enum_points(df.location, season.location_map)
+	df['EndGame'] = enum_points(df.ascent, season.ascent_map)
+	df['Pts'] = df.Bucket + df.Specimen + enum_points(df.location, season.location_map) + df.EndGame + df.Fouls
+	disagg_matches = df[
+		['teamNumber', 'station', 'partnerNumber', 'eventCode', 'matchNumber','playoff', 'win', 'location', 'ascent']
+		+ season.roles['bucket'] + season.roles['specimen'] + list(season.foul_points)
+		+ ['Auto','EndGame', 'Fouls', 'Bucket', 'Specimen', 'isBucket', 'isSpecimen', 'Pts', 'fit0', 'fit1', 'fit2', 'fit3']
+		]
 	return disagg_matches
 
-def update_team_stats(disagg_matches):
-	disagg_matches.win = disagg_matches.win.map({False:0,True:1})
-	disagg_matches.location = disagg_matches.location.map(location_map)
-	disagg_matches.ascent = disagg_matches.ascent.map(ascent_map)
-	disagg_matches.drop(columns=['station', 'partnerNumber', 'playoff', 'isSpecimen'], inplace=True)
-	agg_disagg = { x: 'count' if x in ['matchNumber'] else 'sum' for x in disagg_matches.columns }
-	groups = disagg_matches.groupby(['teamNumber', 'eventCode', 'isBucket'])
-	std_dev = groups.std()[['Bucket', 'Specimen', 'Pts']]
-	std_dev = std_dev.add_prefix('σ ')
-	max_pts = groups.max()[['Bucket', 'Specimen', 'Pts']]
-	max_pts = max_pts.add_prefix('Max ')
-	df = groups.agg(agg_disagg)
-	df[df.columns[4:-4]] = df[df.columns[4:-4]].divide(df.matchNumber,axis='index')
-	df.drop(columns=['teamNumber', 'eventCode', 'isBucket'],inplace=True)
-	df.rename(columns={'Bucket':'x̄ Bucket', 'Specimen': 'x̄ Specimen', 'Pts':'x̄ Pts'},inplace=True)
-	df = pd.merge(df, std_dev, left_index=True, right_index=True)
-	df = pd.merge(df, max_pts, left_index=True, right_index=True)
+@instrument.stage
+def update_disaggregate_matches(matches, stats, dirty=None):
+	disagg_matches = disaggregate_matches(matches, stats)
+	storage.write('disagg_matches', disagg_matches, seasons.current.year, events=dirty)
+	return disagg_matches
+
+def team_stats(disagg_matches):
+	"""Returns each team's per event averages, deviations and maxima, split by whether it played buckets."""
+	season = seasons.current
+	df = disagg_matches.assign(
+		win=disagg_matches.win.astype(int),
+		location=enum_points(disagg_matches.location, season.location_map),
+		ascent=enum_points(disagg_matches.ascent, season.ascent_map)
+		)
+	averaged = ['location', 'ascent'] + season.roles['bucket'] + season.roles['specimen'] + list(season.foul_points) + ['Auto', 'EndGame', 'Fouls', 'Bucket', 'Specimen', 'Pts']
+	fits = ['fit0', 'fit1', 'fit2', 'fit3']
+	points = ['Bucket', 'Specimen', 'Pts']
+	count, sums, squares, max_pts = grouped_moments(df, ['teamNumber', 'eventCode', 'isBucket'], averaged + ['win'] + fits, points)
+	df = sums[averaged].divide(count, axis='index').rename(columns={'Bucket':'x̄ Bucket', 'Specimen': 'x̄ Specimen', 'Pts':'x̄ Pts'})
+	df.insert(0, 'matchNumber', count)
+	df.insert(1, 'win', sums.win.astype(int))
+	std_dev = moments_std(count, sums[points], squares[points]).add_prefix('σ ')
+	df = pd.concat([df, sums[fits].astype(int), std_dev, max_pts.add_prefix('Max ')], axis=1)
 	df.fillna(0, inplace=True)
-	df.to_pickle('data/2024/disagg_stats.pkl')
+	return df
 
-def update_statistics(event_list: list, ftc_api: FtcRequests):
-	"""Updates FTC Into the Deep tracked statistics for events listed by ID. 2024 only."""
-	matches = update_matches(event_list, ftc_api)
-	matches.playoff = matches.playoff.astype('bool')
+@instrument.stage
+def update_team_stats(disagg_matches, dirty=None):
+	df = team_stats(disagg_matches)
+	storage.write('disagg_stats', df, seasons.current.year, events=dirty)
+	return df
+
+# Event shards, run in worker processes
+def process_shard(year, code, event):
+	"""Returns the match rows of one event's fetched data."""
+	seasons.use(year)
+	return process_event(event['mf'], event['qf'], event['pf'], code)
+
+def stats_shard(year, matches):
+	"""Returns the OPR, aggregations, disaggregated matches and team stats of one event's matches, typed to their schemas."""
+	seasons.use(year)
+	reg_matches = matches[~matches.playoff]
+	if reg_matches.empty:
+		return None
+	stats = calculate_event_opr(reg_matches, reg_matches.eventCode.values[0]).rename(columns={'index': 'teamNumber'})
+	disagg_matches = disaggregate_matches(matches, stats)
+	return (
+		schema.apply('stats', stats), aggregate_matches(reg_matches),
+		schema.apply('disagg_matches', disagg_matches), schema.apply('disagg_stats', team_stats(disagg_matches))
+		)
+
+@instrument.stage
+def update_sharded(matches, pool, dirty=None):
+	"""
+	Runs the update_opr through update_team_stats stages with one event per task of a process pool.
+
+	Events are independent for OPR and disaggregation, so each task gets one event's matches and
+	returns its compact typed tables. They are merged in match order and stored exactly as the
+	serial stages store them. Shards go to and from the workers pickled: an event's tables take tens
+	of kilobytes and about 3 ms to unpickle, less than writing and reading them as Arrow or Parquet files.
+	"""
+	year = seasons.current.year
+	shards = [f for _, f in matches.groupby('eventCode', observed=True, sort=False)]
+	results = [result for result in pool.map(stats_shard, repeat(year), shards, chunksize=4) if result is not None]
+	if not results:
+		return
+	stats, agg, disagg_matches, team = [pd.concat(frames) for frames in zip(*results)]
+	storage.write('stats', stats.reset_index(drop=True), year, events=dirty)
+	storage.write('agg_stats', agg, year, events=dirty)
+	storage.write('disagg_matches', disagg_matches.reset_index(drop=True), year, events=dirty)
+	storage.write('disagg_stats', team, year, events=dirty)
+
+def update_event_stats(matches, dirty=None, pool=None):
+	"""Runs the update_opr through update_team_stats stages on tracked matches, in a process pool if one is given, see update_sharded."""
+	matches = matches.astype({'playoff': 'bool'})
+	if pool is not None:
+		update_sharded(matches, pool, dirty)
+		return
 	reg_matches = matches[~matches.playoff]
-	stats = update_opr(reg_matches)
-	update_aggregations(reg_matches)
-	disagg_matches = update_disaggregate_matches(matches, stats)
-	update_team_stats(disagg_matches)
+	stats = update_opr(reg_matches, dirty)
+	update_aggregations(reg_matches, dirty)
+	disagg_matches = update_disaggregate_matches(matches, stats, dirty)
+	update_team_stats(disagg_matches, dirty)
+
+@instrument.stage
+def stream_statistics(event_list: list, ftc_api: FtcRequests, season=False, half_life=None, event_data=None, workers=None, chunk=1):
+	"""
+	Updates the tracked statistics of events chunk events at a time as their data arrives, returning
+	the set of codes of the events that changed.
+
+	Each chunk is processed and its changed events stored with their statistics before the next
+	chunk is taken from the feed, so memory holds about chunk events' working set however many
+	events are listed, e.g. to backfill every region of a season. Larger chunks trade memory for
+	throughput. The stored tables are the same as update_statistics stores. Requires storage that
+	reads and writes events separately, e.g. ParquetStorage, see storage.default_backend, as
+	PickleStorage reads and rewrites whole tables on every chunk.
+
+	The team index, and season-wide OPR with season set, are updated once at the end. That pass
+	reads the full history of every team that played a changed event, and with season set the
+	matches of every changed event, so its memory grows with the events streamed.
+
+	Every chunk is committed with a checkpoint of the events done so far, see storage.transaction.
+	If an update is interrupted, crashes or fails to fetch an event, running it again with the same
+	events resumes after the last committed chunk, and the team index still covers the events the
+	interrupted run stored.
+
+	Args:
+		event_list: list of alphanumeric event identifier strings
+		ftc_api: fetches the event data when event_data is None, see FtcRequests.get_events_data
+		season: also update season-wide OPR, see update_season_opr
+		half_life: days for recency weighting of season-wide OPR
+		event_data: iterable of event data for event_list
+		workers: number of processes to process events in, see update_sharded
+		chunk: events processed and stored at once
+	"""
+	if not storage.backend.partitioned:
+		raise ValueError('Streaming needs storage partitioned by event, e.g. storage.ParquetStorage, which requires pyarrow')
+	year = seasons.current.year
+	event_list = list(event_list)
+	checkpoint = storage.read_blob('checkpoint', year) or {'events': None, 'done': [], 'dirty': []}
+	done = set(checkpoint['done']) if checkpoint['events'] == event_list else set()
+	# Events stored by an earlier run that never got to update the team index
+	dirty = set(checkpoint['dirty'])
+	todo = [code for code in event_list if code not in done]
+	if event_data is None:
+		event_data = ftc_api.get_events_data(todo, year)
+	else:
+		event_data = (event for code, event in zip(event_list, event_data) if code not in done)
+	event_data = iter(event_data)
+	with ProcessPoolExecutor(workers) if workers else nullcontext() as pool:
+		for start in range(0, len(todo), chunk):
+			codes = todo[start:start + chunk]
+			with storage.transaction(year):
+				matches, changed = update_matches(codes, ftc_api, islice(event_data, len(codes)), pool)
+				if changed:
+					update_event_stats(matches, changed, pool)
+				done.update(codes)
+				dirty |= changed
+				storage.write_blob('checkpoint', {'events': event_list, 'done': sorted(done), 'dirty': sorted(dirty)}, year)
+		with storage.transaction(year):
+			if dirty:
+				if season:
+					update_season_opr(storage.read('matches', year, events=dirty), half_life)
+				update_team_index(dirty)
+			storage.remove_blob('checkpoint', year)
+	return dirty
+
+@instrument.stage
+def update_statistics(event_list: list, ftc_api: FtcRequests, full=False, season=False, half_life=None, event_data=None, workers=None, stream=False):
+	"""
+	Updates the tracked statistics of the current season for events listed by ID, see seasons.use.
+
+	Only events whose matches changed are recomputed and spliced into the stored tables,
+	unless full is set, which rebuilds every table from all tracked matches. With season set,
+	season-wide OPR across every event is also kept up to date, see update_season_opr.
+	Event data already fetched for event_list can be passed as event_data to skip fetching it again.
+	With workers set, events are processed in that many processes at once, see update_sharded.
+	With stream set, events are stored one at a time as they arrive to bound memory, see stream_statistics.
+	Every table the update writes is committed at once when it completes, see storage.transaction.
+	"""
+	if stream and not full:
+		stream_statistics(event_list, ftc_api, season, half_life, event_data, workers)
+		return
+	with storage.transaction(seasons.current.year), ProcessPoolExecutor(workers) if workers else nullcontext() as pool:
+		matches, dirty = update_matches(event_list, ftc_api, event_data, pool)
+		if full:
+			dirty = None
+			matches = storage.read('matches', seasons.current.year)
+		elif not dirty:
+			return
+		if season:
+			update_season_opr(matches, half_life)
+		update_event_stats(matches, dirty, pool)
+		update_team_index(dirty)
+
+def update_season(year, event_list, ftc_api_factory=FtcRequests, full=False):
+	"""Switches to a registered season and updates the statistics of its listed events."""
+	seasons.use(year)
+	update_statistics(event_list, ftc_api_factory(), full)
+
+def update_seasons(season_events, ftc_api_factory=FtcRequests, full=False, max_workers=None):
+	"""
+	Updates several seasons at once, each in its own process.
+
+	Seasons store their tables, solver state and overrides under their own year, so their
+	processes never write the same files.
+
+	Args:
+		season_events: dict of season year to list of event codes
+		ftc_api_factory: picklable callable returning the API client each process uses
+		full: rebuild every table from all tracked matches
+		max_workers: maximum processes at once, by default one per core
+	"""
+	with ProcessPoolExecutor(max_workers=max_workers) as pool:
+		futures = [pool.submit(update_season, year, events, ftc_api_factory, full) for year, events in season_events.items()]
+		for future in futures:
+			future.result()
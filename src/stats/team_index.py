@@ -0,0 +1,111 @@
+﻿import numpy as np
+import pandas as pd
+from src.instrument import instrument
+from src.stats import seasons
+from src.storage import storage
+
+# Per event stats rolled up for each team, as used by Prelook
+rollup_stats = ['matchNumber', 'Auto', 'EndGame', 'Fouls', 'x̄ Bucket', 'x̄ Specimen', 'x̄ Pts', 'σ Bucket', 'σ Specimen', 'σ Pts', 'Max Bucket', 'Max Specimen', 'Max Pts']
+summed_stats = ['matchNumber', 'Auto', 'EndGame', 'Fouls', 'x̄ Pts']
+
+def experience(codes: pd.Series):
+	"""Returns the most advanced type of event among a team's event codes, scrimmage codes ending in 'S'."""
+	return 'qualifier' if (codes.str[-1:] != 'S').any() else 'scrimmage'
+
+def build(disagg_stats: pd.DataFrame, disagg_matches: pd.DataFrame, events: pd.DataFrame):
+	"""
+	Returns the index rows of every team in disagg_stats, indexed by teamNumber.
+
+	Each row holds the team's season potential: its per event stats rolled up as Prelook reports them,
+	its most high samples and specimens in a match, the date of its last event, its experience and its
+	event history, comma separated in date order. Events missing from the events table, e.g. out of
+	region ones, count towards everything but the date of the team's last event.
+
+	Args:
+		disagg_stats: stored disagg_stats rows of the teams, from all their events
+		disagg_matches: stored disagg_matches rows of the teams, only tSMPH and tSPCH are used
+		events: the season's events, for their dates
+	"""
+	if disagg_stats.empty:
+		return pd.DataFrame(columns=rollup_stats + ['Last Data', 'Max High Samples', 'Max High Specimens', 'Experience', 'Events'])
+	keys = ['teamNumber', 'eventCode']
+	stats = disagg_stats[rollup_stats].copy()
+	is_bucket = stats.index.get_level_values('isBucket')
+	stats.loc[is_bucket == 0, 'σ Bucket'] = 0
+	stats.loc[is_bucket == 1, 'σ Specimen'] = 0
+
+	# Pooled deviation of points across a team's roles at each event
+	un_bessel = (stats.matchNumber - 1) * stats['σ Pts'] ** 2
+	n = stats.matchNumber.groupby(level=keys, observed=True).sum()
+	std_dev = np.sqrt(un_bessel.groupby(level=keys, observed=True).sum() / (n - 1))
+
+	stats[summed_stats[1:]] = stats[summed_stats[1:]].multiply(stats.matchNumber, axis='index')
+	dates = dict(zip(events['code'], events['date'])) if not events.empty else {}
+	# Parsed so max skips events without a date
+	stats['Last Data'] = pd.to_datetime(stats.index.get_level_values('eventCode').astype(object).map(dates), errors='coerce')
+	stats = stats.groupby(level=keys, observed=True).agg({x: 'sum' if x in summed_stats else 'max' for x in stats.columns})
+	stats['σ Pts'] = std_dev
+	stats[summed_stats[1:]] = stats[summed_stats[1:]].divide(stats.matchNumber, axis='index')
+
+	# Deviations of each team's best bucket and specimen events
+	max_bucket_dev = stats[['x̄ Bucket', 'σ Bucket']].sort_values('x̄ Bucket', ascending=False, kind='stable')['σ Bucket'].groupby('teamNumber').agg('first')
+	max_specimen_dev = stats[['x̄ Specimen', 'σ Specimen']].sort_values('x̄ Specimen', ascending=False, kind='stable')['σ Specimen'].groupby('teamNumber').agg('first')
+
+	history = stats.reset_index()[['teamNumber', 'eventCode', 'Last Data']].astype({'eventCode': object}).sort_values(['Last Data', 'eventCode'])
+	history = history.groupby('teamNumber').eventCode
+
+	index = stats.groupby('teamNumber').agg({x: 'mean' if x == 'Fouls' else 'max' for x in stats.columns})
+	index['σ Bucket'] = max_bucket_dev
+	index['σ Specimen'] = max_specimen_dev
+	max_stats = disagg_matches.groupby('teamNumber')[['tSMPH', 'tSPCH']].agg('max')
+	index['Max High Samples'] = max_stats.tSMPH
+	index['Max High Specimens'] = max_stats.tSPCH
+	index['Experience'] = history.agg(experience)
+	index['Events'] = history.agg(','.join)
+	index['Last Data'] = index['Last Data'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+	index.index = index.index.astype('int32')
+	return index
+
+def read(year=2024, teams=None):
+	"""
+	Returns the stored index rows of the given teams, building them from the stats tables if the
+	index was never written e.g. for tables stored before it existed.
+
+	Args:
+		year: year of competition kickoff
+		teams: only return rows of these team numbers
+	"""
+	index = storage.read('team_index', year, teams=teams)
+	if index.empty:
+		index = build(
+			storage.read('disagg_stats', year, teams=teams),
+			storage.read('disagg_matches', year, columns=['teamNumber', 'tSMPH', 'tSPCH'], teams=teams),
+			storage.read('events', year)
+			)
+	return index
+
+@instrument.stage
+def update_team_index(dirty=None):
+	"""
+	Rebuilds the index rows of every team that played one of the dirty events, from all of its events.
+
+	Every team is rebuilt if the index was never written, e.g. for tables stored before it existed,
+	as it would otherwise only ever hold the teams of events updated since.
+
+	Args:
+		dirty: event codes whose stats changed, None rebuilds every team
+	"""
+	year = seasons.current.year
+	stored = storage.read('team_index', year)
+	teams = None
+	if dirty is not None and not stored.empty:
+		teams = storage.read('disagg_stats', year, events=dirty, columns=[]).index.get_level_values('teamNumber').unique()
+	index = build(
+		storage.read('disagg_stats', year, teams=teams),
+		storage.read('disagg_matches', year, columns=['teamNumber', 'tSMPH', 'tSPCH'], teams=teams),
+		storage.read('events', year)
+		)
+	if teams is not None:
+		index = pd.concat([stored[~stored.index.isin(teams)], index])
+	storage.write('team_index', index, year)
+	return index
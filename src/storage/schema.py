@@ -0,0 +1,42 @@
+﻿import pandas as pd
+
+counter_stats = ['aNet', 'aSMPL', 'aSMPH', 'aSPCL', 'aSPCH', 'tNet', 'tSMPL', 'tSMPH', 'tSPCL', 'tSPCH', 'miFoul', 'maFoul']
+match_types = {
+	'teamNumber': 'int32', 'station': 'category', 'partnerNumber': 'int32', 'eventCode': 'category', 'matchNumber': 'int16',
+	'playoff': 'bool', 'win': 'bool', 'location': 'category', 'ascent': 'category'
+	}
+
+# Column dtypes of each season table, columns not listed keep whatever dtype they have
+SCHEMAS = {
+	'matches': {**match_types, **{stat + '_A': 'int16' for stat in counter_stats}},
+	'stats': {'teamNumber': 'int32', 'eventCode': 'category', **{stat + '_O': 'float64' for stat in counter_stats}},
+	'disagg_matches': {
+		**match_types, **{stat: 'int16' for stat in counter_stats},
+		**{c: 'int16' for c in ['Auto', 'EndGame', 'Fouls', 'Bucket', 'Specimen', 'Pts', 'fit0', 'fit1', 'fit2', 'fit3']},
+		'isBucket': 'int8', 'isSpecimen': 'int8'
+		},
+	'disagg_stats': {
+		'matchNumber': 'int16', 'win': 'int16', **{c: 'int32' for c in ['fit0', 'fit1', 'fit2', 'fit3']},
+		**{c: 'int16' for c in ['Max Bucket', 'Max Specimen', 'Max Pts']}
+		}
+	}
+
+def apply(table, df):
+	"""Returns a table cast to its schema, only touching the columns it has."""
+	schema = SCHEMAS.get(table, {})
+	types = {c: t for c, t in schema.items() if c in df.columns and df[c].dtype != t}
+	return df.astype(types) if types else df
+
+def memory_report(tables):
+	"""
+	Returns the in-memory size of each table as stored and as untyped object columns.
+
+	Args:
+		tables: dict of table name to DataFrame
+	"""
+	rows = []
+	for name, df in tables.items():
+		typed = df.memory_usage(deep=True).sum()
+		untyped = df.astype(object).memory_usage(deep=True).sum()
+		rows.append({'table': name, 'rows': len(df), 'MB': typed / 2**20, 'untyped MB': untyped / 2**20, 'ratio': untyped / typed if typed else 0})
+	return pd.DataFrame(rows).set_index('table')
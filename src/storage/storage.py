@@ -0,0 +1,462 @@
+﻿import importlib.util
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from src.storage import schema
+
+# How each table is ordered once its events are combined, matching a full rebuild
+ORDER = {
+	'matches': lambda df: df.reset_index(drop=True),
+	'stats': lambda df: df.sort_values('eventCode', kind='stable').reset_index(drop=True),
+	'agg_stats': lambda df: df.sort_index(),
+	'disagg_matches': lambda df: df.reset_index(drop=True),
+	'disagg_stats': lambda df: df.sort_index(),
+	'team_index': lambda df: df.sort_index()
+	}
+
+### Helpers
+def level_values(df, label):
+	"""Returns a column or index level of a table, or None if it has neither."""
+	if label in df.columns:
+		return df[label]
+	if label in df.index.names:
+		return pd.Series(df.index.get_level_values(label), index=df.index)
+	return None
+
+def select(df, events=None, columns=None, teams=None):
+	"""Returns the rows of a table for the given events and teams, with only the given columns."""
+	for label, values in [('eventCode', events), ('teamNumber', teams)]:
+		if values is not None and level_values(df, label) is not None:
+			df = df[level_values(df, label).isin(values)]
+	if columns is not None:
+		df = df[[c for c in df.columns if c in columns]]
+	return df
+
+def order(table, df):
+	return ORDER[table](df) if table in ORDER else df
+
+def file_signature(paths):
+	"""Returns the (path, mtime, size) of each existing file, which changes whenever one of them is rewritten."""
+	stats = []
+	for path in paths:
+		try:
+			st = os.stat(path)
+		except FileNotFoundError:
+			continue
+		stats.append((path, st.st_mtime_ns, st.st_size))
+	return tuple(stats)
+
+def freeze(df):
+	"""Makes the arrays behind a DataFrame read-only in place, so changing its values raises ValueError."""
+	for block in df._mgr.blocks:
+		values = getattr(block.values, '_ndarray', block.values)
+		if isinstance(values, np.ndarray):
+			values.flags.writeable = False
+	return df
+
+def write_json(path, value):
+	with open(path + '.tmp', 'w', encoding='utf-8') as f:
+		json.dump(value, f)
+	os.replace(path + '.tmp', path)
+
+class Storage(ABC):
+	"""
+	Where the season tables live. Subclasses decide how tables are laid out on disk, implementing
+	read, write and signature.
+
+	Tables with an eventCode column or index level are stored by event, so reading one event
+	only touches that event and writing with events only replaces those events.
+
+	Every file is written under a temporary name then renamed into place, so a crash never leaves
+	one half written. Writes inside a transaction are committed all at once, see transaction.
+
+	Args:
+		root: folder holding one subfolder per season
+	"""
+	# Whether reading or writing some events only touches their files, not whole tables
+	partitioned = False
+
+	def __init__(self, root='data'):
+		self.root = root
+		# Files removed by each season's open transaction, relative to its folder
+		self.staged = {}
+
+	def season_dir(self, year=2024):
+		return os.path.join(self.root, str(year))
+
+	def pending_dir(self, year=2024):
+		"""Returns the folder an open transaction stages a season's files in, mirroring the season folder."""
+		return os.path.join(self.season_dir(year), '.pending')
+
+	def manifest_path(self, year=2024):
+		return os.path.join(self.season_dir(year), '.commit.json')
+
+	def version(self, year=2024):
+		"""Returns the number of transactions committed to a season, which names its current snapshot of tables."""
+		path = os.path.join(self.season_dir(year), 'VERSION')
+		if not os.path.exists(path):
+			return 0
+		with open(path, encoding='utf-8') as f:
+			return int(f.read())
+
+	def locate(self, path, year=2024):
+		"""Returns where to read a season file from, its staged copy in an open transaction if it has one, or None if it doesn't exist."""
+		if year in self.staged:
+			relative = os.path.relpath(path, self.season_dir(year))
+			if relative in self.staged[year]:
+				return None
+			if os.path.exists(os.path.join(self.pending_dir(year), relative)):
+				return os.path.join(self.pending_dir(year), relative)
+		return path if os.path.exists(path) else None
+
+	def listdir(self, folder, year=2024):
+		"""Returns the names of the files in a season folder, as an open transaction sees them."""
+		names = set(os.listdir(folder)) if os.path.isdir(folder) else set()
+		if year in self.staged:
+			relative = os.path.relpath(folder, self.season_dir(year))
+			pending = os.path.join(self.pending_dir(year), relative)
+			names |= set(os.listdir(pending)) if os.path.isdir(pending) else set()
+			names = {name for name in names if os.path.join(relative, name) not in self.staged[year]}
+		return sorted(name for name in names if not name.endswith('.tmp'))
+
+	def save(self, path, write, year=2024):
+		"""
+		Writes a season file by calling write with a temporary path, then renames it into place, or
+		into the staging folder of an open transaction.
+		"""
+		if year in self.staged:
+			relative = os.path.relpath(path, self.season_dir(year))
+			self.staged[year].discard(relative)
+			path = os.path.join(self.pending_dir(year), relative)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		write(path + '.tmp')
+		os.replace(path + '.tmp', path)
+
+	def remove(self, path, year=2024):
+		"""Deletes a season file, when the open transaction commits if there is one."""
+		if year in self.staged:
+			relative = os.path.relpath(path, self.season_dir(year))
+			if os.path.exists(path):
+				self.staged[year].add(relative)
+			if os.path.exists(os.path.join(self.pending_dir(year), relative)):
+				os.remove(os.path.join(self.pending_dir(year), relative))
+		elif os.path.exists(path):
+			os.remove(path)
+
+	@contextmanager
+	def transaction(self, year=2024):
+		"""
+		Stages every write to a season inside the block, then commits them all at once as the season's
+		next version. If the block raises, e.g. on Ctrl+C, nothing is committed. Reads inside the block
+		see the staged files. Nested transactions join the outer one.
+
+		A commit writes a manifest of the staged files, then renames them into place. Writing the
+		manifest is the commit point: a crash before it leaves the previous version untouched, one after
+		it is rolled forward when the season's next transaction starts, see recover. A season takes one
+		writing process at a time.
+		"""
+		if year in self.staged:
+			yield
+			return
+		self.recover(year)
+		self.staged[year] = set()
+		try:
+			yield
+		except BaseException:
+			del self.staged[year]
+			shutil.rmtree(self.pending_dir(year), ignore_errors=True)
+			raise
+		removed = self.staged.pop(year)
+		pending = self.pending_dir(year)
+		files = [
+			os.path.relpath(os.path.join(folder, name), pending)
+			for folder, _, names in os.walk(pending) for name in names if not name.endswith('.tmp')
+			]
+		if not files and not removed:
+			return
+		write_json(self.manifest_path(year), {'version': self.version(year) + 1, 'files': sorted(files), 'removed': sorted(removed)})
+		self.recover(year)
+
+	def recover(self, year=2024):
+		"""
+		Finishes a season's commit whose manifest was written, and drops the staged files of a
+		transaction that never committed. Renaming every staged file is safe to repeat, so a commit
+		interrupted again while recovering still completes.
+		"""
+		path = self.manifest_path(year)
+		if os.path.exists(path):
+			with open(path, encoding='utf-8') as f:
+				manifest = json.load(f)
+			for relative in manifest['files']:
+				staged = os.path.join(self.pending_dir(year), relative)
+				if os.path.exists(staged):
+					os.makedirs(os.path.dirname(os.path.join(self.season_dir(year), relative)), exist_ok=True)
+					os.replace(staged, os.path.join(self.season_dir(year), relative))
+			for relative in manifest['removed']:
+				if os.path.exists(os.path.join(self.season_dir(year), relative)):
+					os.remove(os.path.join(self.season_dir(year), relative))
+			write_json(os.path.join(self.season_dir(year), 'VERSION'), manifest['version'])
+			os.remove(path)
+		shutil.rmtree(self.pending_dir(year), ignore_errors=True)
+
+	def blob_path(self, name, year=2024):
+		"""Returns the path of a pickled object that is not a table, e.g. a solver state."""
+		return os.path.join(self.season_dir(year), name + '.pkl')
+
+	def read_blob(self, name, year=2024):
+		"""Returns a stored object that is not a table, or None if it was never written."""
+		path = self.locate(self.blob_path(name, year), year)
+		return None if path is None else pd.read_pickle(path)
+
+	def write_blob(self, name, value, year=2024):
+		self.save(self.blob_path(name, year), lambda path: pd.to_pickle(value, path), year)
+
+	def remove_blob(self, name, year=2024):
+		self.remove(self.blob_path(name, year), year)
+
+	@abstractmethod
+	def read(self, table, year=2024, events=None, columns=None, teams=None):
+		"""
+		Returns a stored table, or an empty DataFrame if it was never written.
+
+		Args:
+			table: table name e.g. 'matches'
+			year: year of comeptetion kickoff
+			events: only return rows of these event codes
+			columns: only return these columns, the index is always kept
+			teams: only return rows of these team numbers
+		"""
+
+	@abstractmethod
+	def write(self, table, df, year=2024, events=None):
+		"""
+		Stores a table.
+
+		Args:
+			table: table name e.g. 'matches'
+			df: the table, or with events set, the fresh rows of those events
+			year: year of comeptetion kickoff
+			events: only replace the rows of these event codes, None replaces the whole table
+		"""
+
+	@abstractmethod
+	def signature(self, table, year=2024):
+		"""Returns a value that changes whenever a stored table is rewritten, by anyone, see file_signature."""
+
+class PickleStorage(Storage):
+	"""Stores each table as a single pickle, data/<year>/<table>.pkl."""
+	def path(self, table, year=2024):
+		return os.path.join(self.season_dir(year), table + '.pkl')
+
+	def read(self, table, year=2024, events=None, columns=None, teams=None):
+		path = self.locate(self.path(table, year), year)
+		if path is None:
+			return pd.DataFrame()
+		return schema.apply(table, select(pd.read_pickle(path), events, columns, teams))
+
+	def write(self, table, df, year=2024, events=None):
+		path = self.locate(self.path(table, year), year)
+		if events is not None and path is not None:
+			stored = pd.read_pickle(path)
+			df = pd.concat([stored[~level_values(stored, 'eventCode').isin(events)], df])
+		self.save(self.path(table, year), order(table, schema.apply(table, df)).to_pickle, year)
+
+	def signature(self, table, year=2024):
+		return file_signature([self.locate(self.path(table, year), year) or self.path(table, year)])
+
+class ParquetStorage(Storage):
+	"""
+	Stores tables as Parquet, one file per event: data/<year>/<table>/<eventCode>.parquet.
+
+	Writing an event only writes its file. Column projection and team filters are pushed down to the
+	Parquet reader. A table only stored by PickleStorage is copied over the first time it is used,
+	see migrate. Requires pyarrow, which is imported on first use.
+	"""
+	partitioned = True
+
+	@property
+	def pq(self):
+		import pyarrow.parquet
+		return pyarrow.parquet
+
+	def folder(self, table, year=2024):
+		return os.path.join(self.season_dir(year), table)
+
+	def files(self, table, year=2024):
+		return [f for f in self.listdir(self.folder(table, year), year) if f.endswith('.parquet')]
+
+	def migrate(self, table, year=2024):
+		"""
+		Copies a table PickleStorage stored into event files in one transaction, unless the table
+		already has a folder. The pickle is left in place.
+		"""
+		pickle = os.path.join(self.season_dir(year), table + '.pkl')
+		if self.locate(self.folder(table, year), year) is not None or not os.path.exists(pickle):
+			return
+		with self.transaction(year):
+			self.write_partitions(table, pd.read_pickle(pickle), year)
+
+	def read(self, table, year=2024, events=None, columns=None, teams=None):
+		self.migrate(table, year)
+		folder = self.folder(table, year)
+		files = self.files(table, year)
+		if events is not None and '_all.parquet' not in files:
+			wanted = set(events)
+			files = [f for f in files if f[:-len('.parquet')] in wanted]
+		if not files:
+			return pd.DataFrame()
+		paths = [self.locate(os.path.join(folder, f), year) for f in files]
+		fields = self.pq.read_schema(paths[0]).names
+		filters = [('teamNumber', 'in', list(teams))] if teams is not None and 'teamNumber' in fields else None
+		# Filter columns are read too, then dropped by select
+		projection = None if columns is None else [c for c in fields if c in columns or c in ('eventCode', 'teamNumber')]
+		dataset = self.pq.ParquetDataset(paths, filters=filters)
+		df = dataset.read(columns=projection, use_pandas_metadata=True).to_pandas()
+		return schema.apply(table, select(order(table, df), events, columns, teams))
+
+	def write(self, table, df, year=2024, events=None):
+		self.migrate(table, year)
+		self.write_partitions(table, df, year, events)
+
+	def write_partitions(self, table, df, year=2024, events=None):
+		"""Stores a table as its events' files, see write."""
+		folder = self.folder(table, year)
+		df = schema.apply(table, df)
+		codes = level_values(df, 'eventCode')
+		if codes is None:
+			self.save(os.path.join(folder, '_all.parquet'), df.to_parquet, year)
+			return
+		if events is None:
+			events = set(os.path.splitext(f)[0] for f in self.files(table, year))
+		for code in set(events) - set(codes):
+			self.remove(os.path.join(folder, code + '.parquet'), year)
+		for code, partition in df.groupby(codes.to_numpy(), sort=False):
+			self.save(os.path.join(folder, code + '.parquet'), partition.to_parquet, year)
+
+	def signature(self, table, year=2024):
+		self.migrate(table, year)
+		folder = self.folder(table, year)
+		return file_signature([self.locate(os.path.join(folder, f), year) for f in self.files(table, year)])
+
+class TableCache:
+	"""
+	Memoizes whole stored tables across seasons and backends, dropping the least recently used
+	once they take more than maxsize bytes.
+
+	A cached table is reloaded when its files change on disk, and dropped when written through this
+	module. Callers get shallow copies over read-only arrays: adding or replacing columns only
+	touches their copy, while changing values in place raises ValueError, so call copy() first.
+	Object columns, e.g. event names, are copied instead since pandas can't measure read-only ones.
+
+	Args:
+		maxsize: bytes of tables to keep in memory
+	"""
+	def __init__(self, maxsize=512 * 2**20):
+		self.maxsize = maxsize
+		self.tables = OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	def get(self, storage: Storage, table, year=2024):
+		"""Returns a stored table, read from storage only if it is not cached or changed since."""
+		key = (storage, table, year)
+		signature = storage.signature(table, year)
+		with self.lock:
+			entry = self.tables.get(key)
+			if entry is not None and entry[0] == signature:
+				self.tables.move_to_end(key)
+				self.hits += 1
+				return self.view(entry[1])
+			self.misses += 1
+		df = storage.read(table, year)
+		size = int(df.memory_usage(deep=True).sum())
+		freeze(df)
+		with self.lock:
+			self.drop(key)
+			if size <= self.maxsize:
+				self.tables[key] = (signature, df, size)
+				self.size += size
+			while self.size > self.maxsize:
+				self.drop(next(iter(self.tables)))
+		return self.view(df)
+
+	@staticmethod
+	def view(df):
+		"""Returns a shallow copy of a cached table, with its own copy of any object columns."""
+		view = df.copy(deep=False)
+		for column in view.columns[view.dtypes == object]:
+			view[column] = view[column].copy()
+		return view
+
+	def drop(self, key):
+		entry = self.tables.pop(key, None)
+		if entry is not None:
+			self.size -= entry[2]
+
+	def invalidate(self, storage: Storage = None, table=None, year=None):
+		"""Drops the cached tables matching every given argument, all of them by default."""
+		with self.lock:
+			for key in [k for k in self.tables if all(v is None or v == k[i] for i, v in enumerate((storage, table, year)))]:
+				self.drop(key)
+
+	def info(self):
+		return {'tables': len(self.tables), 'bytes': self.size, 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+def copy_tables(source: Storage, target: Storage, year=2024):
+	"""Copies every season table between storage backends e.g. from pickles to Parquet."""
+	for table in list(ORDER) + ['events', 'season_stats']:
+		df = source.read(table, year)
+		if not df.empty:
+			target.write(table, df, year)
+
+def default_backend(root='data'):
+	"""Returns ParquetStorage if pyarrow is installed, otherwise PickleStorage."""
+	return ParquetStorage(root) if importlib.util.find_spec('pyarrow') is not None else PickleStorage(root)
+
+backend = default_backend()
+# Whole tables read through load, shared by every backend and season
+cache = TableCache()
+
+def use(storage: Storage):
+	"""Switches every reader and writer to another storage backend."""
+	global backend
+	backend = storage
+
+def read(table, year=2024, events=None, columns=None, teams=None):
+	return backend.read(table, year, events, columns, teams)
+
+def write(table, df, year=2024, events=None):
+	backend.write(table, df, year, events)
+	cache.invalidate(backend, table, year)
+
+def load(table, year=2024):
+	"""Returns a whole stored table through the cache, see TableCache. Values are read-only, copy() to change them."""
+	return cache.get(backend, table, year)
+
+def read_blob(name, year=2024):
+	return backend.read_blob(name, year)
+
+def write_blob(name, value, year=2024):
+	backend.write_blob(name, value, year)
+
+def remove_blob(name, year=2024):
+	backend.remove_blob(name, year)
+
+def transaction(year=2024):
+	"""Commits every write to a season inside a with block at once, see Storage.transaction."""
+	return backend.transaction(year)
+
+def version(year=2024):
+	return backend.version(year)
+
+def memory_report(year=2024):
+	"""Returns the in-memory footprint of every typed season table, see schema.memory_report."""
+	return schema.memory_report({table: read(table, year) for table in schema.SCHEMAS})
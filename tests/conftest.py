@@ -0,0 +1,31 @@
+﻿import os
+import sys
+import pytest
+
+# Tests import the pipeline from the repo root, as ftc_data.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_api import FakeApi
+from src.benchmark.synthetic import SyntheticSeason
+from src.stats import seasons
+from src.storage import storage
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+	"""Runs a test in an empty folder, as the pipeline keeps data/ and reports/ in the working directory."""
+	monkeypatch.chdir(tmp_path)
+	seasons.use(2024)
+	storage.cache.invalidate()
+	yield tmp_path
+	storage.cache.invalidate()
+
+@pytest.fixture
+def fake_api(workdir):
+	"""Serves a synthetic season from a local FakeApi, with the credentials FtcRequests reads on its first request."""
+	os.makedirs(os.path.join('src', 'ftc_api'))
+	for name in ['.auth', '.api-key']:
+		with open(os.path.join('src', 'ftc_api', name), 'w') as f:
+			f.write('test')
+	api = FakeApi(SyntheticSeason(n_events=4, seed=1))
+	yield api
+	api.close()
\ No newline at end of file
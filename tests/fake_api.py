@@ -0,0 +1,117 @@
+﻿import hashlib
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+class FakeApi:
+	"""
+	A local stand-in for the FTC Event API, serving a SyntheticSeason's events over HTTP.
+
+	Serves the match, qualifier score and playoff score endpoints of each event, with an ETag so
+	conditional GETs get a 304 while a body is unchanged. Only the first qualifiers of an event can be
+	scored so far, see score. Every request is delayed by delay seconds, and the next requests can be
+	answered with injected statuses, see fail. The path, time and client connection of every request
+	are recorded.
+
+	Args:
+		season: SyntheticSeason serving the events
+	"""
+	def __init__(self, season):
+		self.season = season
+		self.scored = {}
+		self.delay = 0.0
+		self.failures = deque()
+		self.paths = []
+		self.times = []
+		self.clients = set()
+		self.in_flight = 0
+		self.max_in_flight = 0
+		self.lock = threading.Lock()
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+		self.server.daemon_threads = True
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+
+	def close(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def score(self, event_code, qualifiers=None):
+		"""Serves only the first qualifiers of an event and none of its playoffs, or all of it if None."""
+		self.scored[event_code] = qualifiers
+
+	def fail(self, status, count=1, retry_after=None, delay=0.0, body=b'{}'):
+		"""Answers the next count requests with a status and body, after delay seconds and with a Retry-After if given."""
+		headers = {} if retry_after is None else {'Retry-After': str(retry_after)}
+		self.failures.extend([(status, headers, delay, body)] * count)
+
+	def body(self, path, query):
+		"""Returns the decoded body of an API path, or None if it is not served."""
+		m = re.fullmatch(r'/v2\.0/\d+/(matches|scores)/(\w+)(?:/(qual|playoff))?', path)
+		if m:
+			matches, quals, playoffs = self.season.event_bodies(m.group(2))
+			qualifiers = self.scored.get(m.group(2))
+			if qualifiers is not None:
+				matches = {'matches': [r for r in matches['matches'] if r['tournamentLevel'] == 'QUALIFICATION' and r['matchNumber'] <= qualifiers]}
+				quals = {'matchScores': quals['matchScores'][:qualifiers]}
+				playoffs = {'matchScores': []}
+			if m.group(1) == 'matches':
+				return matches
+			return quals if m.group(3) == 'qual' else playoffs
+		if re.fullmatch(r'/v2\.0/\d+/teams', path):
+			teams = self.season.get_event_teams(query['eventCode'][0])
+			return {'teams': [{'teamNumber': number, 'nameShort': name} for number, name in teams.items()]}
+		return None
+
+	def handler(self):
+		api = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def log_message(self, *args):
+				pass
+
+			def reply(self, status, data=b'', headers=()):
+				self.send_response(status)
+				for name, value in headers:
+					self.send_header(name, value)
+				self.send_header('Content-Length', str(len(data)))
+				self.end_headers()
+				try:
+					self.wfile.write(data)
+				except (BrokenPipeError, ConnectionResetError):
+					# The client timed out and hung up
+					pass
+
+			def do_GET(self):
+				url = urlsplit(self.path)
+				with api.lock:
+					api.paths.append(url.path)
+					api.times.append(time.monotonic())
+					api.clients.add(self.client_address)
+					api.in_flight += 1
+					api.max_in_flight = max(api.max_in_flight, api.in_flight)
+					failure = api.failures.popleft() if api.failures else None
+				try:
+					time.sleep(api.delay + (failure[2] if failure else 0))
+					if failure is not None:
+						return self.reply(failure[0], failure[3], failure[1].items())
+					body = api.body(url.path, parse_qs(url.query))
+					if body is None:
+						return self.reply(404, b'{}')
+					data = json.dumps(body).encode()
+					etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+					if self.headers.get('If-None-Match') == etag:
+						return self.reply(304, headers=[('ETag', etag)])
+					self.reply(200, data, [('ETag', etag), ('Content-Type', 'application/json')])
+				finally:
+					with api.lock:
+						api.in_flight -= 1
+
+		return Handler
\ No newline at end of file
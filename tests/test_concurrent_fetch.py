@@ -0,0 +1,47 @@
+﻿import time
+import pandas as pd
+import requests
+from src.ftc_api.ftc_requests import FtcRequests
+
+def test_events_data_match_served_events(fake_api):
+	codes = list(fake_api.season.events.code)
+	api = FtcRequests(max_workers=4, server=fake_api.url, cache_dir=None)
+	for code, event in zip(codes, api.get_events_data(codes)):
+		expected = fake_api.season.get_event_data(code)
+		for key in ['mf', 'qf', 'pf']:
+			pd.testing.assert_frame_equal(event[key], expected[key], check_dtype=False)
+
+def test_in_flight_requests_bounded_by_workers(fake_api):
+	fake_api.delay = 0.05
+	codes = list(fake_api.season.events.code)
+	api = FtcRequests(max_workers=3, server=fake_api.url, cache_dir=None)
+	assert len(list(api.get_events_data(codes))) == len(codes)
+	assert len(fake_api.paths) == 3 * len(codes)
+	assert 1 < fake_api.max_in_flight <= 3
+
+def test_requests_share_one_session(fake_api, monkeypatch):
+	sessions = []
+	new_session = requests.Session
+	def session():
+		sessions.append(new_session())
+		return sessions[-1]
+	monkeypatch.setattr(requests, 'Session', session)
+	fake_api.delay = 0.02
+	codes = list(fake_api.season.events.code)
+	api = FtcRequests(max_workers=3, server=fake_api.url, cache_dir=None)
+	list(api.get_events_data(codes))
+	assert len(sessions) == 1
+	# Kept-alive connections are reused, at most one per worker
+	assert len(fake_api.clients) <= 3
+
+def test_prefetch_bounded(fake_api):
+	fake_api.delay = 0.02
+	codes = list(fake_api.season.events.code) * 5
+	api = FtcRequests(max_workers=3, server=fake_api.url, cache_dir=None)
+	events = api.get_events_data(codes)
+	next(events)
+	time.sleep(0.3)
+	# The event consumed, the one fetched ahead to keep the workers busy and the one submitted before yielding
+	assert len(fake_api.paths) <= 3 * 3
+	assert len(list(events)) == len(codes) - 1
+	assert len(fake_api.paths) == 3 * len(codes)
\ No newline at end of file
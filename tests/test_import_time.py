@@ -0,0 +1,27 @@
+﻿import subprocess
+import sys
+import pytest
+from src.benchmark import benchmark
+
+# Seconds importing ftc_data may take, well above the few milliseconds of a lazy import and well below pandas
+IMPORT_BUDGET = 0.1
+
+def test_import_within_budget():
+	assert benchmark.import_time() <= IMPORT_BUDGET
+
+def test_import_loads_no_heavy_modules():
+	code = 'import sys, ftc_data; print(",".join(m for m in ["numpy", "pandas", "requests"] if m in sys.modules))'
+	loaded = subprocess.run([sys.executable, '-c', code], cwd=benchmark.ROOT, capture_output=True, text=True, check=True).stdout
+	assert loaded.strip() == ''
+
+def test_lazy_module_loads_on_first_use():
+	code = 'import sys, ftc_data; ftc_data.seasons.current; print("pandas" in sys.modules)'
+	loaded = subprocess.run([sys.executable, '-c', code], cwd=benchmark.ROOT, capture_output=True, text=True, check=True).stdout
+	assert loaded.strip() == 'True'
+
+@pytest.mark.parametrize('budget, status', [(IMPORT_BUDGET, 0), (0.0, 1)])
+def test_budget_check_exit_status(budget, status, capsys):
+	with pytest.raises(SystemExit) as exit:
+		benchmark.main(['--import-budget', str(budget)])
+	assert exit.value.code == status
+	assert '"budget": {}'.format(budget) in capsys.readouterr().out
\ No newline at end of file
@@ -0,0 +1,61 @@
+﻿import copy
+import os
+import pandas as pd
+from src.benchmark.synthetic import SyntheticSeason
+from src.ftc_api.ftc_requests import FtcRequests
+from src.stats.live import EventWatcher, ReplayFeed
+from src.stats.stats import update_statistics
+from src.storage import storage
+
+TABLES = ['matches', 'stats', 'agg_stats', 'disagg_matches', 'disagg_stats', 'team_index']
+
+def rescored(bodies, number):
+	"""Returns an event's bodies with a qualifier's first red robot parked elsewhere and the match modified later."""
+	matches, quals, playoffs = copy.deepcopy(bodies)
+	match = next(m for m in matches['matches'] if m['tournamentLevel'] == 'QUALIFICATION' and m['matchNumber'] == number)
+	match['modifiedOn'] = match['modifiedOn'][:-3] + '999'
+	red = next(s for s in quals['matchScores'] if s['matchNumber'] == number)['alliances'][0]
+	red['robot1Auto'] = 'NONE' if red['robot1Auto'] != 'NONE' else 'OBSERVATION_ZONE'
+	return matches, quals, playoffs
+
+def report_stamps():
+	return {name: os.stat(os.path.join('reports', name)).st_mtime_ns for name in os.listdir('reports')}
+
+def test_replayed_event(workdir, monkeypatch):
+	season = SyntheticSeason(n_events=1, seed=11)
+	code = season.events.code[0]
+	storage.write('events', season.events)
+	bodies = season.event_bodies(code)
+	feed = ReplayFeed({code: FtcRequests.frame_event_data(*bodies)}, {code: season.get_event_teams(code)}, step=4)
+	watcher = EventWatcher(code, feed, interval=0)
+	mf = feed.events[code]['mf']
+	keys = list(zip(mf.tournamentLevel, mf.series, mf.matchNumber))
+
+	# Only the matches revealed since the last poll are processed
+	for start in range(0, len(keys), 4):
+		records = watcher.poll()
+		assert [(r['tournamentLevel'], r['series'], r['matchNumber']) for r in records] == keys[start:start + 4]
+	assert len(storage.read('matches', 2024)) == 4 * len(keys)
+
+	# Nothing new, nothing written
+	stamps = report_stamps()
+	assert watcher.poll() == []
+	assert report_stamps() == stamps
+
+	# A rescored match replaces its rows
+	feed.events[code] = FtcRequests.frame_event_data(*rescored(bodies, 3))
+	records = watcher.poll()
+	assert [(r['tournamentLevel'], r['series'], r['matchNumber']) for r in records] == [('QUALIFICATION', 0, 3)]
+	matches = storage.read('matches', 2024)
+	assert len(matches) == 4 * len(keys)
+	red1 = matches[(matches.matchNumber == 3) & ~matches.playoff & (matches.station == 'red1')]
+	assert list(red1.location.astype(str)) == [feed.events[code]['qf'].set_index('matchNumber').alliances[3][0]['robot1Auto']]
+
+	# The same tables as updating with the final data at once
+	live = {table: storage.read(table, 2024) for table in TABLES}
+	os.makedirs(workdir / 'one_shot')
+	monkeypatch.chdir(workdir / 'one_shot')
+	storage.write('events', season.events)
+	update_statistics([code], feed, event_data=[feed.events[code]])
+	for table in TABLES:
+		pd.testing.assert_frame_equal(live[table], storage.read(table, 2024))
\ No newline at end of file
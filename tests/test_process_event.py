@@ -0,0 +1,125 @@
+﻿import os
+import pandas as pd
+import pytest
+from src.benchmark.synthetic import SyntheticSeason
+from src.ftc_api.ftc_requests import FtcRequests
+from src.stats import seasons
+from src.stats.stats import flatten_teams, process_event, stations
+from src.storage import schema
+
+# Match rows of real events, as the row by row process_event stored them, less the qualifiers
+# its playoff rows overwrote, see baseline_process_event
+real_matches = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', '2024', 'matches.pkl')
+
+def baseline_process_event(mf, qf, pf, eventCode):
+	"""
+	The row by row process_event that flatten_teams and flatten_stage replaced, kept as the reference.
+
+	Rows are written at the end of the table, where the original wrote them at i * 4 + len(df), which
+	let playoff rows overwrite qualifier rows.
+	"""
+	mf, qf, pf = mf.copy(), qf.copy(), pf.copy()
+	for station in stations:
+		mf[station] = [0] * len(mf)
+	mf.loc[mf.series > 0, 'matchNumber'] = mf.series
+	for i, row in mf.iterrows():
+		tf = pd.DataFrame(row.teams)
+		for station in stations:
+			mf.at[i, station] = tf[tf.station == station.title()].teamNumber.values[0]
+	df = pd.DataFrame(columns=seasons.current.match_columns)
+
+	def process_stage(is_playoff, f):
+		for i, row in f.iterrows():
+			sf = pd.DataFrame(row.alliances)
+			offset = len(df)
+			level = "PLAYOFF" if is_playoff else "QUALIFICATION"
+			margin = sf.loc[sf.alliance == 'Red', 'totalPoints'].values[0] - sf.loc[sf.alliance == 'Blue', 'totalPoints'].values[0]
+			scheduled = mf.loc[(mf.matchNumber == row.matchNumber) & (mf.tournamentLevel == level)]
+			for index, (station, partner) in enumerate(zip(stations, ['red2', 'red1', 'blue2', 'blue1'])):
+				alliance = sf[sf.alliance == station[:-1].title()]
+				robot = "robot" + station[-1:]
+				df.at[offset + index, 'teamNumber'] = scheduled[station].values[0]
+				df.at[offset + index, 'station'] = station
+				df.at[offset + index, 'partnerNumber'] = scheduled[partner].values[0]
+				df.at[offset + index, 'eventCode'] = eventCode
+				df.at[offset + index, 'matchNumber'] = row.matchNumber
+				df.at[offset + index, 'playoff'] = is_playoff
+				df.at[offset + index, 'win'] = margin > 0 if index < 2 else margin < 0
+				df.at[offset + index, 'location'] = alliance[robot + 'Auto'].values[0]
+				df.at[offset + index, 'ascent'] = alliance[robot + 'Teleop'].values[0]
+				for key, stat in seasons.current.score_map.items():
+					df.at[offset + index, stat] = alliance[key].values[0]
+
+	process_stage(False, qf)
+	if not pf.empty:
+		pf.matchNumber = pf.matchSeries
+		process_stage(True, pf)
+	return df
+
+def api_bodies(rows: pd.DataFrame):
+	"""Returns the match, qualifier score and playoff score bodies an event's stored rows were processed from."""
+	score_map = seasons.current.score_map
+	matches, quals, playoffs = [], [], []
+	for (playoff, number), match in rows.groupby(['playoff', 'matchNumber'], sort=False):
+		match = match.set_index('station')
+		level = 'PLAYOFF' if playoff else 'QUALIFICATION'
+		series, number = (number, 1) if playoff else (0, number)
+		matches.append({
+			'tournamentLevel': level, 'series': series, 'matchNumber': number,
+			'teams': [{'teamNumber': match.at[s, 'teamNumber'], 'station': s.title()} for s in stations]
+			})
+		alliances = []
+		for color, robots in [('Red', ['red1', 'red2']), ('Blue', ['blue1', 'blue2'])]:
+			a = {'alliance': color, 'totalPoints': int(match.at[robots[0], 'win'])}
+			for robot, station in enumerate(robots, 1):
+				a['robot{}Auto'.format(robot)] = match.at[station, 'location']
+				a['robot{}Teleop'.format(robot)] = match.at[station, 'ascent']
+			a.update({key: match.at[robots[0], stat] for key, stat in score_map.items()})
+			alliances.append(a)
+		(playoffs if playoff else quals).append({'matchLevel': level, 'matchSeries': series, 'matchNumber': number, 'alliances': alliances})
+	return {'matches': matches}, {'matchScores': quals}, {'matchScores': playoffs}
+
+def plain(df):
+	"""Returns a table with object columns and a fresh index, so tables compare by value whatever their dtypes."""
+	return df.astype(object).reset_index(drop=True)
+
+def match_order(df):
+	"""Returns a table's rows by stage, match and station."""
+	keys = df.assign(station=df.station.astype(object).map(stations.index))
+	return df.loc[keys.sort_values(['playoff', 'matchNumber', 'station'], kind='stable').index]
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_synthetic_events_match_baseline(seed):
+	season = SyntheticSeason(n_events=3, seed=seed)
+	for code in season.events.code:
+		event = season.get_event_data(code)
+		expected = schema.apply('matches', baseline_process_event(event['mf'], event['qf'], event['pf'], code))
+		processed = process_event(event['mf'], event['qf'], event['pf'], code)
+		pd.testing.assert_frame_equal(plain(processed), plain(expected))
+		# Every qualifier is kept alongside the playoffs
+		assert len(processed) == 4 * (len(event['qf']) + len(event['pf']))
+
+def test_qualifiers_only_match_baseline():
+	season = SyntheticSeason(n_events=1, seed=3)
+	code = season.events.code[0]
+	event = season.get_event_data(code)
+	event['pf'] = event['pf'].iloc[:0]
+	expected = schema.apply('matches', baseline_process_event(event['mf'], event['qf'], event['pf'], code))
+	pd.testing.assert_frame_equal(plain(process_event(event['mf'], event['qf'], event['pf'], code)), plain(expected))
+
+def test_flatten_teams_matches_baseline_schedule():
+	season = SyntheticSeason(n_events=1, seed=4)
+	mf = season.get_event_data(season.events.code[0])['mf']
+	teams = flatten_teams(mf)
+	for _, row in mf.iterrows():
+		number = row.series if row.series > 0 else row.matchNumber
+		for team in row.teams:
+			assert teams.at[(number, row.tournamentLevel), team['station'].lower()] == team['teamNumber']
+
+@pytest.mark.skipif(not os.path.exists(real_matches), reason='no stored real matches')
+def test_real_events_match_stored_rows():
+	stored = pd.read_pickle(real_matches)
+	for code, rows in stored.groupby('eventCode', sort=False):
+		event = FtcRequests.frame_event_data(*api_bodies(rows))
+		processed = process_event(event['mf'], event['qf'], event['pf'], code)
+		pd.testing.assert_frame_equal(plain(match_order(processed)), plain(match_order(schema.apply('matches', rows))))
\ No newline at end of file
@@ -0,0 +1,72 @@
+﻿import os
+import threading
+import time
+from datetime import datetime, timedelta
+from src.ftc_api.ftc_requests import FtcRequests
+from src.ftc_api.response_cache import ResponseCache
+from src.storage import storage
+
+def store_events(fake_api, started):
+	"""Stores the synthetic events as all starting on the same day."""
+	storage.write('events', fake_api.season.events.assign(date=started.strftime('%Y-%m-%dT00:00:00')))
+
+def backdate_cache(directory, age: timedelta):
+	"""Makes every cached entry look confirmed fresh age ago."""
+	stamp = time.time() - age.total_seconds()
+	for name in os.listdir(directory):
+		os.utime(os.path.join(directory, name), (stamp, stamp))
+
+def test_live_event_is_revalidated(fake_api):
+	code = fake_api.season.events.code[0]
+	store_events(fake_api, datetime.now())
+	api = FtcRequests(server=fake_api.url)
+	first = api.get_event_data(code)
+	second = api.get_event_data(code)
+	assert len(fake_api.paths) == 6
+	assert api.cache.stats() == {'hits': 0, 'revalidated': 3, 'misses': 3}
+	assert first['qf'].equals(second['qf'])
+
+def test_completed_event_is_pinned(fake_api):
+	code = fake_api.season.events.code[0]
+	store_events(fake_api, datetime.now() - timedelta(days=30))
+	api = FtcRequests(server=fake_api.url)
+	api.get_event_data(code)
+	api.get_event_data(code)
+	assert len(fake_api.paths) == 3
+	assert api.cache.stats() == {'hits': 3, 'revalidated': 0, 'misses': 3}
+
+def test_completed_event_cached_while_live_is_revalidated_once(fake_api):
+	code = fake_api.season.events.code[0]
+	qualifiers = len(fake_api.season.event_bodies(code)[1]['matchScores'])
+	store_events(fake_api, datetime.now() - timedelta(days=30))
+	fake_api.score(code, 5)
+	api = FtcRequests(server=fake_api.url)
+	assert len(api.get_event_data(code)['qf']) == 5
+	# Cached on the day of the event, long before it became final
+	backdate_cache('data/cache', timedelta(days=30))
+
+	fake_api.score(code, None)
+	assert len(api.get_event_data(code)['qf']) == qualifiers
+	assert len(api.get_event_data(code)['qf']) == qualifiers
+	assert len(fake_api.paths) == 6
+	assert api.cache.stats() == {'hits': 3, 'revalidated': 0, 'misses': 6}
+
+def test_concurrent_stores_of_one_url(tmp_path):
+	cache = ResponseCache(str(tmp_path))
+	url = 'https://example.org/v2.0/2024/matches/A'
+	errors = []
+	def store(writer):
+		try:
+			for _ in range(50):
+				cache.store(url, None, {'matches': [writer] * 1000}, {'ETag': str(writer)})
+		except Exception as e:
+			errors.append(e)
+	threads = [threading.Thread(target=store, args=(writer,)) for writer in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert errors == []
+	entry, _ = cache.load(url)
+	assert entry['body'] == {'matches': [int(entry['etag'])] * 1000}
+	assert os.listdir(tmp_path) == [os.path.basename(cache.path(url))]
\ No newline at end of file
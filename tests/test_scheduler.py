@@ -0,0 +1,98 @@
+﻿import json
+import threading
+import time
+import pytest
+import requests
+from src.ftc_api.ftc_requests import FtcRequests
+from src.ftc_api.scheduler import BACKFILL, RequestScheduler
+
+def client(fake_api, **limits):
+	"""Returns an uncached FtcRequests for the fake API, with a scheduler quick to time out and retry."""
+	scheduler = RequestScheduler(**{'timeout': (1, 0.2), 'backoff': 0.01, 'max_backoff': 0.05, **limits})
+	return FtcRequests(server=fake_api.url, cache_dir=None, scheduler=scheduler)
+
+def matches(fake_api, code):
+	return json.loads(json.dumps(fake_api.season.event_bodies(code)[0]))
+
+def test_throttled_request_waits_retry_after(fake_api):
+	code = fake_api.season.events.code[0]
+	fake_api.fail(429, retry_after=0.3)
+	api = client(fake_api)
+	assert api.get('v2.0/2024/matches/' + code) == matches(fake_api, code)
+	assert fake_api.times[1] - fake_api.times[0] >= 0.25
+	stats = api.scheduler.stats()
+	assert (stats['requests'], stats['throttled'], stats['retries'], stats['failed']) == (2, 1, 1, 0)
+
+def test_server_error_is_retried(fake_api):
+	code = fake_api.season.events.code[0]
+	fake_api.fail(503, count=2)
+	api = client(fake_api)
+	assert api.get('v2.0/2024/matches/' + code) == matches(fake_api, code)
+	stats = api.scheduler.stats()
+	assert (stats['requests'], stats['server_errors'], stats['retries'], stats['failed']) == (3, 2, 2, 0)
+
+def test_slow_response_times_out_and_is_retried(fake_api):
+	code = fake_api.season.events.code[0]
+	fake_api.fail(200, delay=0.6)
+	api = client(fake_api)
+	assert api.get('v2.0/2024/matches/' + code) == matches(fake_api, code)
+	stats = api.scheduler.stats()
+	assert (stats['requests'], stats['timeouts'], stats['retries'], stats['failed']) == (2, 1, 1, 0)
+
+def test_failure_returned_once_retries_run_out(fake_api):
+	fake_api.fail(503, count=3)
+	api = client(fake_api, retries=2)
+	assert api.fetch(fake_api.url + 'v2.0/2024/matches/' + fake_api.season.events.code[0]).status_code == 503
+	assert len(fake_api.paths) == 3
+	assert api.scheduler.stats()['failed'] == 1
+
+def test_timeout_raised_once_retries_run_out(fake_api):
+	fake_api.fail(200, count=2, delay=0.6)
+	api = client(fake_api, retries=1)
+	with pytest.raises(requests.Timeout):
+		api.fetch(fake_api.url + 'v2.0/2024/matches/' + fake_api.season.events.code[0])
+	stats = api.scheduler.stats()
+	assert (stats['timeouts'], stats['failed']) == (2, 1)
+
+def test_get_raises_once_retries_run_out(fake_api):
+	code = fake_api.season.events.code[0]
+	# Every attempt at each of the event's three endpoints
+	fake_api.fail(503, count=9)
+	api = client(fake_api, retries=2)
+	with pytest.raises(requests.HTTPError) as error:
+		api.get_event_data(code)
+	assert error.value.response.status_code == 503
+	assert code in error.value.response.url
+
+def test_proxy_error_page_is_raised_not_cached(fake_api):
+	code = fake_api.season.events.code[0]
+	fake_api.fail(502, count=2, body=b'<html><body>Bad Gateway</body></html>')
+	scheduler = RequestScheduler(timeout=(1, 0.2), backoff=0.01, max_backoff=0.05, retries=1)
+	api = FtcRequests(server=fake_api.url, scheduler=scheduler)
+	with pytest.raises(requests.HTTPError):
+		api.get('v2.0/2024/matches/' + code)
+	assert api.get('v2.0/2024/matches/' + code) == matches(fake_api, code)
+	assert api.cache.stats()['revalidated'] == 0
+
+def test_rate_limit_holds(fake_api):
+	codes = list(fake_api.season.events.code)
+	api = client(fake_api, rate=20, burst=2)
+	list(api.get_events_data(codes))
+	# A burst of 2 requests, then one every 1 / 20 s
+	assert fake_api.times[-1] - fake_api.times[0] >= (len(fake_api.times) - 2) / 20 * 0.9
+
+def test_live_requests_go_before_backfill(fake_api):
+	fake_api.delay = 0.03
+	live, *codes = fake_api.season.events.code
+	api = client(fake_api, max_in_flight=1)
+	backfill = threading.Thread(target=lambda: list(api.get_events_data(codes * 2, priority=BACKFILL)))
+	backfill.start()
+	time.sleep(0.2)
+	assert api.scheduler.stats()['queued_backfill'] > 0
+	api.get_event_data(live)
+	backfill.join()
+	requested = [live in path for path in fake_api.paths]
+	first = requested.index(True)
+	# The live event's requests went one after another, ahead of the backfill still waiting
+	assert requested[first:first + 3] == [True] * 3
+	assert not any(requested[first + 3:]) and len(requested) > first + 3
\ No newline at end of file
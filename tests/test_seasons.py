@@ -0,0 +1,33 @@
+﻿import copy
+import pandas as pd
+import pytest
+from src.stats import seasons
+from src.storage import storage
+
+@pytest.fixture
+def own_storage_season(workdir, monkeypatch):
+	"""Registers a 2023 season with its own storage, restoring the season and storage in use afterwards."""
+	for module, name in [(seasons, 'current'), (seasons, 'shared_backend'), (storage, 'backend')]:
+		monkeypatch.setattr(module, name, getattr(module, name))
+	season = copy.copy(seasons.into_the_deep)
+	season.year = 2023
+	season.backend = storage.PickleStorage('other')
+	monkeypatch.setitem(seasons.SEASONS, 2023, season)
+	return season
+
+def test_switching_back_restores_shared_storage(own_storage_season):
+	shared = storage.backend
+	seasons.use(2023)
+	assert storage.backend is own_storage_season.backend
+	storage.write('events', pd.DataFrame({'code': ['A'], 'date': ['2023-10-01T00:00:00']}), 2023)
+	seasons.use(2024)
+	assert storage.backend is shared
+	assert storage.read('events', 2023).empty
+	assert list(own_storage_season.backend.read('events', 2023).code) == ['A']
+
+def test_switching_back_keeps_chosen_storage(own_storage_season):
+	chosen = storage.PickleStorage('chosen')
+	storage.use(chosen)
+	seasons.use(2023)
+	seasons.use(2024)
+	assert storage.backend is chosen
\ No newline at end of file
@@ -0,0 +1,30 @@
+﻿import os
+import pandas as pd
+from src.benchmark.synthetic import SyntheticSeason
+from src.stats.stats import update_statistics
+from src.storage import storage
+
+TABLES = ['matches', 'stats', 'agg_stats', 'disagg_matches', 'disagg_stats', 'team_index']
+
+def run_updates(folder, monkeypatch, season, workers):
+	"""
+	Runs an update of partly scored events, then one finishing some of them and adding the rest, in a
+	folder of its own, returning the stored tables.
+	"""
+	os.makedirs(folder)
+	monkeypatch.chdir(folder)
+	codes = list(season.events.code)
+	storage.write('events', season.events)
+	partial = [season.get_event_data(code) for code in codes[:3]]
+	partial = [{'mf': e['mf'], 'qf': e['qf'].iloc[:10], 'pf': e['pf'].iloc[:0]} for e in partial]
+	update_statistics(codes[:3], season, workers=workers, event_data=partial)
+	update_statistics(codes[1:], season, workers=workers)
+	return {table: storage.read(table, 2024) for table in TABLES}
+
+def test_sharded_update_matches_serial(workdir, monkeypatch):
+	season = SyntheticSeason(n_events=5, seed=8)
+	serial = run_updates(workdir / 'serial', monkeypatch, season, None)
+	sharded = run_updates(workdir / 'sharded', monkeypatch, season, 2)
+	for table in TABLES:
+		assert not serial[table].empty
+		pd.testing.assert_frame_equal(sharded[table], serial[table])
\ No newline at end of file
@@ -0,0 +1,104 @@
+﻿import os
+import pandas as pd
+import pytest
+from src.storage import storage
+
+def stats(codes, value=1.0):
+	"""Returns a small stats table with two teams at each event."""
+	return pd.DataFrame({
+		'teamNumber': [team for _ in codes for team in (1, 2)],
+		'eventCode': [code for code in codes for _ in (1, 2)],
+		'x_O': value
+		})
+
+def event_file(backend, code):
+	return os.path.join(backend.folder('stats'), code + '.parquet')
+
+class Crash(BaseException):
+	pass
+
+@pytest.fixture
+def parquet(workdir):
+	return storage.ParquetStorage()
+
+def test_default_is_parquet_with_pyarrow():
+	pytest.importorskip('pyarrow')
+	assert isinstance(storage.default_backend(), storage.ParquetStorage)
+
+def test_write_only_touches_written_events(parquet):
+	parquet.write('stats', stats(['A', 'B', 'C']))
+	before = {code: os.stat(event_file(parquet, code)).st_mtime_ns for code in 'AC'}
+	parquet.write('stats', stats(['B'], 2.0), events={'B'})
+	assert {code: os.stat(event_file(parquet, code)).st_mtime_ns for code in 'AC'} == before
+	assert list(parquet.read('stats', events=['B']).x_O) == [2.0, 2.0]
+	assert list(parquet.read('stats').x_O) == [1.0, 1.0, 2.0, 2.0, 1.0, 1.0]
+
+def test_removed_event_loses_its_file(parquet):
+	parquet.write('stats', stats(['A', 'B']))
+	parquet.write('stats', stats(['A']), events={'A', 'B'})
+	assert not os.path.exists(event_file(parquet, 'B'))
+	assert set(parquet.read('stats').eventCode) == {'A'}
+
+def test_read_pushes_down_teams_and_columns(parquet):
+	parquet.write('stats', stats(['A', 'B']))
+	df = parquet.read('stats', events=['B'], columns=['x_O'], teams=[2])
+	assert list(df.columns) == ['x_O'] and len(df) == 1
+
+def test_pickled_table_is_migrated(workdir):
+	storage.PickleStorage().write('stats', stats(['A', 'B']))
+	parquet = storage.ParquetStorage()
+	pd.testing.assert_frame_equal(parquet.read('stats'), storage.PickleStorage().read('stats'))
+	assert os.path.exists(event_file(parquet, 'A'))
+	# Writes after the copy only go to the event files
+	parquet.write('stats', stats(['B'], 2.0), events={'B'})
+	assert list(parquet.read('stats').x_O) == [1.0, 1.0, 2.0, 2.0]
+	assert list(storage.PickleStorage().read('stats').x_O) == [1.0] * 4
+
+def test_failed_transaction_is_rolled_back(parquet):
+	parquet.write('stats', stats(['A']))
+	with pytest.raises(ValueError):
+		with parquet.transaction():
+			parquet.write('stats', stats(['A'], 2.0), events={'A'})
+			parquet.write('stats', stats(['B']), events={'B'})
+			assert set(parquet.read('stats').eventCode) == {'A', 'B'}
+			raise ValueError
+	assert list(parquet.read('stats').x_O) == [1.0, 1.0]
+	assert not os.path.exists(parquet.pending_dir())
+	assert parquet.version() == 0
+
+def test_leftover_commit_is_rolled_forward(parquet, monkeypatch):
+	parquet.write('stats', stats(['A', 'B']))
+	recover = parquet.recover
+	def crash(year=2024):
+		# Dies right after the commit point, before renaming the staged files into place
+		if os.path.exists(parquet.manifest_path(year)):
+			raise Crash
+		recover(year)
+	monkeypatch.setattr(parquet, 'recover', crash)
+	with pytest.raises(Crash):
+		with parquet.transaction():
+			parquet.write('stats', stats(['A'], 2.0), events={'A', 'B'})
+	monkeypatch.setattr(parquet, 'recover', recover)
+	assert os.path.exists(parquet.manifest_path())
+	assert set(parquet.read('stats').eventCode) == {'A', 'B'}
+
+	# The next transaction, e.g. of a new process, finishes the commit first
+	restarted = storage.ParquetStorage()
+	with restarted.transaction():
+		assert list(restarted.read('stats').x_O) == [2.0, 2.0]
+	assert not os.path.exists(restarted.manifest_path())
+	assert restarted.version() == 1
+
+def test_cache_reloads_changed_tables(parquet, monkeypatch):
+	monkeypatch.setattr(storage, 'backend', parquet)
+	storage.write('stats', stats(['A']))
+	first = storage.load('stats')
+	with pytest.raises(ValueError):
+		first.loc[0, 'x_O'] = 5.0
+	assert storage.load('stats') is not first
+	assert storage.cache.info()['hits'] >= 1
+	storage.write('stats', stats(['A'], 2.0), events={'A'})
+	assert list(storage.load('stats').x_O) == [2.0, 2.0]
+	# Written by another process, so only the files tell
+	storage.ParquetStorage().write('stats', stats(['A'], 3.0), events={'A'})
+	assert list(storage.load('stats').x_O) == [3.0, 3.0]
\ No newline at end of file
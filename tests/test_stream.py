@@ -0,0 +1,60 @@
+﻿import os
+import pandas as pd
+import pytest
+from src.benchmark.synthetic import SyntheticSeason
+from src.stats import stats
+from src.stats.stats import stream_statistics, update_statistics
+from src.storage import storage
+
+TABLES = ['matches', 'stats', 'agg_stats', 'disagg_matches', 'disagg_stats', 'team_index']
+# Tables stored by event
+EVENT_TABLES = TABLES[:-1]
+
+@pytest.fixture
+def parquet(workdir, monkeypatch):
+	monkeypatch.setattr(storage, 'backend', storage.ParquetStorage())
+	return storage.backend
+
+def stored_tables():
+	return {table: storage.read(table, 2024) for table in TABLES}
+
+def test_stream_needs_partitioned_storage(workdir, monkeypatch):
+	monkeypatch.setattr(storage, 'backend', storage.PickleStorage())
+	season = SyntheticSeason(n_events=2, seed=9)
+	with pytest.raises(ValueError):
+		stream_statistics(list(season.events.code), season)
+
+def test_stream_matches_one_shot_update(parquet, workdir, monkeypatch):
+	season = SyntheticSeason(n_events=4, seed=9)
+	codes = list(season.events.code)
+	for folder, stream in [('one_shot', False), ('streamed', True)]:
+		os.makedirs(workdir / folder)
+		monkeypatch.chdir(workdir / folder)
+		storage.write('events', season.events)
+		update_statistics(codes, season, stream=stream)
+	streamed = stored_tables()
+	monkeypatch.chdir(workdir / 'one_shot')
+	for table, df in stored_tables().items():
+		pd.testing.assert_frame_equal(streamed[table], df)
+
+def test_chunks_only_touch_their_events(parquet, monkeypatch):
+	season = SyntheticSeason(n_events=4, seed=10)
+	codes = list(season.events.code)
+	storage.write('events', season.events)
+	calls = []
+	read, write = parquet.read, parquet.write
+	def record_read(table, year=2024, events=None, columns=None, teams=None):
+		calls.append((table, events))
+		return read(table, year, events, columns, teams)
+	def record_write(table, df, year=2024, events=None):
+		calls.append((table, events))
+		return write(table, df, year, events)
+	monkeypatch.setattr(parquet, 'read', record_read)
+	monkeypatch.setattr(parquet, 'write', record_write)
+	# Stops recording at the final pass, which reads the full history of the teams
+	monkeypatch.setattr(stats, 'update_team_index', lambda dirty: calls.append(None))
+	stream_statistics(codes, season)
+	chunks = calls[:calls.index(None)]
+	assert {table for table, _ in chunks} == set(EVENT_TABLES)
+	for table, events in chunks:
+		assert events is not None and len(events) == 1, table
\ No newline at end of file
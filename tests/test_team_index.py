@@ -0,0 +1,64 @@
+﻿import glob
+import os
+import shutil
+import pandas as pd
+from src.benchmark.synthetic import SyntheticSeason
+from src.stats import team_index
+from src.stats.stats import update_statistics
+from src.storage import storage
+
+def event_data(season, codes, qualifiers=None):
+	"""Yields the synthetic data of each event, with only the first qualifiers scored if given."""
+	for code in codes:
+		event = season.get_event_data(code)
+		if qualifiers is not None:
+			event = {'mf': event['mf'], 'qf': event['qf'].iloc[:qualifiers], 'pf': event['pf'].iloc[:0]}
+		yield event
+
+def full_index(year=2024):
+	return team_index.build(
+		storage.read('disagg_stats', year),
+		storage.read('disagg_matches', year, columns=['teamNumber', 'tSMPH', 'tSPCH']),
+		storage.read('events', year)
+		)
+
+def test_event_without_date(workdir):
+	season = SyntheticSeason(n_events=3, seed=5)
+	codes = list(season.events.code)
+	# The first event is missing from the events table, e.g. out of region
+	storage.write('events', season.events[season.events.code != codes[0]])
+	update_statistics(codes, season)
+
+	index = storage.read('team_index', 2024)
+	undated = set(season.get_event_teams(codes[0]))
+	dated = set(season.get_event_teams(codes[1])) | set(season.get_event_teams(codes[2]))
+	assert undated <= set(index.index)
+	assert index.loc[sorted(undated - dated), 'Last Data'].isna().all()
+	dates = dict(zip(season.events.code, season.events.date))
+	for team in sorted(undated & dated):
+		events = index.at[team, 'Events'].split(',')
+		assert codes[0] in events
+		assert index.at[team, 'Last Data'] == max(dates[code] for code in events if code != codes[0])
+
+def test_first_update_indexes_every_team(workdir):
+	season = SyntheticSeason(n_events=4, seed=6)
+	codes = list(season.events.code)
+	storage.write('events', season.events)
+	update_statistics(codes, season, event_data=event_data(season, codes, qualifiers=12))
+	# Tables stored before the index existed
+	for path in glob.glob(os.path.join('data', '2024', 'team_index*')):
+		shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+	update_statistics(codes[:1], season, event_data=event_data(season, codes[:1]))
+	index = storage.read('team_index', 2024)
+	teams = storage.read('disagg_stats', 2024).index.get_level_values('teamNumber').unique()
+	assert set(index.index) == set(teams)
+	pd.testing.assert_frame_equal(index, full_index(), check_dtype=False)
+
+def test_incremental_update_matches_full_build(workdir):
+	season = SyntheticSeason(n_events=4, seed=7)
+	codes = list(season.events.code)
+	storage.write('events', season.events)
+	update_statistics(codes, season, event_data=event_data(season, codes, qualifiers=12))
+	update_statistics(codes[1:2], season, event_data=event_data(season, codes[1:2]))
+	pd.testing.assert_frame_equal(storage.read('team_index', 2024), full_index(), check_dtype=False)
\ No newline at end of file
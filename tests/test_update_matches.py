@@ -0,0 +1,18 @@
+﻿import warnings
+from src.benchmark.synthetic import SyntheticSeason
+from src.stats.stats import update_matches
+from src.storage import storage
+
+def test_new_events_ingest_without_warnings(workdir):
+	season = SyntheticSeason(n_events=3, seed=12)
+	codes = list(season.events.code)
+	storage.write('events', season.events)
+	with warnings.catch_warnings():
+		warnings.simplefilter('error', FutureWarning)
+		update_matches(codes[:1], season)
+		# The first event is stored, the others ingested for the first time
+		matches, dirty = update_matches(codes, season)
+		assert dirty == set(codes[1:])
+		assert len(storage.read('matches', 2024)) == len(storage.read('matches', 2024, events=codes[:1])) + len(matches)
+		_, dirty = update_matches(codes, season)
+	assert dirty == set()
\ No newline at end of file